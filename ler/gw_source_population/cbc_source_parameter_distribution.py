@@ -10,7 +10,6 @@ import numpy as np
 from numba import njit
 
 # for redshift to luminosity distance conversion
-from astropy.cosmology import LambdaCDM
 
 # from gwcosmo import priors as p
 from scipy.integrate import quad
@@ -20,7 +19,7 @@ from gwcosmo import priors as p
 
 # for multiprocessing
 # Import helper routines
-from ..utils import interpolator_from_pickle, cubic_spline_interpolator
+from ..utils import interpolator_from_pickle, cubic_spline_interpolator, default_cosmology
 
 # import redshift distribution sampler
 from .cbc_source_redshift_distribution import CBCSourceRedshiftDistribution
@@ -236,7 +235,7 @@ class CBCSourceParameterDistribution(CBCSourceRedshiftDistribution):
     Dictionary of prior sampler functions' input parameters.
     """
 
-    cosmo = LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+    cosmo = None
     """``astropy.cosmology`` \n
     Cosmology to use.
     """
@@ -262,7 +261,7 @@ class CBCSourceParameterDistribution(CBCSourceRedshiftDistribution):
         # set attributes
         self.z_min = z_min
         self.z_max = z_max
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         # note that self.cosmo is initialized in the super class
         self.spin_zero = spin_zero
         self.spin_precession = spin_precession
@@ -17,9 +17,8 @@ from numba import njit
 from scipy.integrate import quad
 
 # for redshift to luminosity distance conversion
-from astropy.cosmology import LambdaCDM
 
-from ..utils import  interpolator_from_pickle, cubic_spline_interpolator, inverse_transform_sampler
+from ..utils import  interpolator_from_pickle, cubic_spline_interpolator, inverse_transform_sampler, default_cosmology
 from .jit_functions import merger_rate_density_bbh_popI_II_oguri2018, star_formation_rate_madau_dickinson2014, merger_rate_density_bbh_popIII_ken2022, merger_rate_density_bbh_primordial_ken2022
 
 
@@ -204,7 +203,7 @@ class CBCSourceRedshiftDistribution(object):
         self.z_max = z_max
         self.event_type = event_type
         # if None is passed, use the default cosmology
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         # setting up the interpolator creation parameters
         self.c_n_i = dict(
             redshift_distribution=dict(create_new=False, resolution=1000), z_to_luminosity_distance=dict(create_new=False, resolution=1000), differential_comoving_volume=dict(create_new=False, resolution=1000))
@@ -5,10 +5,7 @@ This module contains various functions use for simulating GW source population.
 
 import numpy as np
 from numba import njit, jit
-from astropy.cosmology import LambdaCDM
-cosmo = LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
-
-from ler.utils import inverse_transform_sampler
+from ler.utils import inverse_transform_sampler, default_cosmology
 
 # import pickle
 # # call the interpolator
@@ -145,7 +142,7 @@ def star_formation_rate_madau_dickinson2014(
 
 # @jit
 def merger_rate_density_bbh_primordial_ken2022(
-        zs, cosmology=cosmo, n0=0.044 * 1e-9, t0=13.786885302009708
+        zs, cosmology=None, n0=0.044 * 1e-9, t0=13.786885302009708
     ):
         """
         Function to compute the merger rate density (Primordial). Reference: Ng et al. 2022. The output is in detector frame and is unnormalized.
@@ -173,6 +170,7 @@ def merger_rate_density_bbh_primordial_ken2022(
         ----------
         """
 
+        cosmology = cosmology if cosmology else default_cosmology()
         # rate density
         rate_density = n0 * (cosmology.age(z=zs).value / t0) ** (-34 / 37)
 
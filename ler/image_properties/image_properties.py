@@ -15,15 +15,12 @@ from tqdm import tqdm
 import numpy as np
 from numba import njit
 
-from astropy.cosmology import LambdaCDM
-cosmo = LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
-
 # the following .py file will be called if they are not given in the class initialization
 from .multiprocessing_routine import solve_lens_equation
 
 
 
-from ..utils import  interpolator_from_pickle, cubic_spline_interpolator
+from ..utils import  interpolator_from_pickle, cubic_spline_interpolator, default_cosmology
 
 class ImageProperties():
     """
@@ -138,7 +135,7 @@ class ImageProperties():
         self.spin_precession = spin_precession
         self.geocent_time_min = geocent_time_min
         self.geocent_time_max = geocent_time_max
-        self.cosmo = cosmology if cosmology else cosmo
+        self.cosmo = cosmology if cosmology else default_cosmology()
         
         # initialize the interpolator's parameters
         self.create_new_interpolator = dict(
@@ -159,7 +156,7 @@ class ImageProperties():
             sub_directory="luminosity_distance_to_z",
             name="luminosity_distance_to_z",
             x = np.linspace(z_min, z_max, resolution),
-            pdf_func= lambda z_: cosmo.luminosity_distance(z_).value, 
+            pdf_func= lambda z_: self.cosmo.luminosity_distance(z_).value, 
             conditioned_y=None, 
             dimension=1,
             category="function_inverse",
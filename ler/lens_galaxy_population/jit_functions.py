@@ -1,10 +1,15 @@
 import numpy as np
-from numba import njit
+from numba import njit, prange
 #from scipy.stats import rayleigh
 from ..utils import inverse_transform_sampler, cubic_spline_interpolator
 
+C_LIGHT = 299792.458  # speed of light in km/s
+FOURPI_OVER_C2 = 4.0 * np.pi / C_LIGHT**2  # prefactor of the SIS Einstein radius, for sigma in km/s
+CACHE_BLOCK_BYTES = 1 << 20  # lookup tables larger than this are sampled bin by bin
+VD_QUANTILE_POWER = 3.0  # the velocity dispersion quantile table is tabulated at u = 1-(1-t)**VD_QUANTILE_POWER, for t uniform in [0, 1]
 
-@njit
+
+@njit(cache=True)
 def axis_ratio_SIS(sigma):
     """
     Function to sample axis ratio from the SIS distribution with given velocity dispersion.
@@ -22,7 +27,7 @@ def axis_ratio_SIS(sigma):
 
     return np.ones(len(sigma))
     
-@njit
+@njit(cache=True)
 def gamma_(x):
     # Coefficients for the Lanczos approximation
     g = 7
@@ -41,7 +46,7 @@ def gamma_(x):
         t = x + g + 0.5
         return np.sqrt(2 * np.pi) * t**(x + 0.5) * np.exp(-t) * y
     
-@njit
+@njit(cache=True)
 def cvdf_fit(log_vd, redshift):
     # Coefficients for the fit. Use in the derivation velocity dispersion function (at local universe), Bernardi et al. (2010).
     this_vars = np.array([
@@ -53,12 +58,12 @@ def cvdf_fit(log_vd, redshift):
     mstar = log_vd - coeffs[3]
     return coeffs[0] + coeffs[1] * mstar + coeffs[2] * mstar ** 2 - np.exp(mstar)
 
-@njit
+@njit(cache=True)
 def my_derivative(log_vd, redshift, dx):
     # Derivative of the cvdf_fit function. Use in the derivation velocity dispersion function (at local universe), Bernardi et al. (2010).
     return 0.5 * (cvdf_fit(log_vd + dx, redshift) - cvdf_fit(log_vd - dx, redshift)) / dx
 
-@njit
+@njit(cache=True)
 def pdf_phi_z_div_0(s, z):
     # Derivation of the pdf of velocity dispersion function (at redshift z), Oguri et al. (2018b). This lacks the scaling factor.
     log_vd = np.log10(s)
@@ -67,7 +72,7 @@ def pdf_phi_z_div_0(s, z):
 
     return phi_sim_z / phi_sim_0
 
-@njit
+@njit(cache=True)
 def phi(s, z, alpha, beta, phistar, sigmastar):
     """
     Function to calculate the lens galaxy velocity dispersion function at redshift z.
@@ -91,7 +96,7 @@ def phi(s, z, alpha, beta, phistar, sigmastar):
     # result[result < 0.] = 0.
     return result
 
-@njit
+@njit(cache=True)
 def phi_loc_bernardi(sigma, alpha, beta, phistar, sigmastar):
     """
     Function to calculate the local universe velocity dispersion function. Bernardi et al. (2010).
@@ -117,7 +122,30 @@ def phi_loc_bernardi(sigma, alpha, beta, phistar, sigmastar):
     return philoc_
 
 # For elliptical lens galaxy
-@njit
+@njit(cache=True)
+def phi_cut_SIE_scalar(q):
+    """
+    Function to calculate cross-section scaling factor for the SIE lens galaxy from SIS lens galaxy, for a single axis ratio.
+
+    Parameters
+    ----------
+    q : `float`
+        axis ratio of the lens galaxy
+
+    Returns
+    -------
+    result : `float`
+        scaling factor
+    """
+
+    if 0.01 < q < 0.99:
+        return (2 * q * np.log(q)) / (q ** 2 - 1)
+    elif q < 0.01:
+        return -2 * np.log(q) * q
+    else:
+        return 1.0
+
+@njit(cache=True)
 def phi_cut_SIE(q):
     """
     Function to calculate cross-section scaling factor for the SIE lens galaxy from SIS lens galaxy.
@@ -136,59 +164,74 @@ def phi_cut_SIE(q):
     n = len(q)
     result = np.empty(n)
     for i in range(n):
-        val = q[i]
-        if 0.01 < val < 0.99:
-            result[i] = (2 * np.pi * val * np.log(val)) / (val ** 2 - 1)
-        elif val < 0.01:
-            result[i] = -2 * (np.pi * np.log(val)) * val
-        else:
-            result[i] = np.pi
-    return result/np.pi
+        result[i] = phi_cut_SIE_scalar(q[i])
+    return result
 
-@njit
-def axis_ratio_rayleigh(sigma, q_min=0.2, q_max=1.0):
-        """
-        Function to sample axis ratio from rayleigh distribution with given velocity dispersion.
+@njit(parallel=True, fastmath=True, cache=True)
+def cross_section_SIE(theta_E, q):
+    """
+    Function to calculate the cross-section of the SIE lens galaxy, up to the factor of pi, and its maximum in a single pass.
 
-        Parameters
-        ----------
-        sigma : `float: array`
-            velocity dispersion of the lens galaxy
+    Parameters
+    ----------
+    theta_E : `numpy.ndarray` (1D array of float)
+        Einstein radii of the lens galaxies
+    q : `numpy.ndarray` (1D array of float)
+        axis ratios of the lens galaxies
 
-        Returns
-        -------
-        q : `float: array`
-            axis ratio of the lens galaxy
-        """
+    Returns
+    -------
+    cross_section : `numpy.ndarray` (1D array of float)
+        theta_E^2 * phi_cut_SIE(q)
+    cross_section_max : `float`
+        maximum of the cross_section
+    """
 
-        size = len(sigma)
-        a = sigma / 161.0
-        q = np.ones(size)
-        idx = np.arange(size)  # idx tracker
-        size_ = size
+    n = len(theta_E)
+    cross_section = np.empty(n)
+    cross_section_max = 0.0
+    for i in prange(n):
+        val = theta_E[i] * theta_E[i] * phi_cut_SIE_scalar(q[i])
+        cross_section[i] = val
+        cross_section_max = max(cross_section_max, val)
+    return cross_section, cross_section_max
 
-        while size_ != 0:
-            # Draw the axis ratio see Appendix of https://arxiv.org/pdf/1807.07062.pdf
-            s = 0.38 - 0.09177 * a[idx]
-            s[s<=0] = 0.0001
-            u = np.random.uniform(0, 1, size=size_)
-            b = s * np.sqrt(-2 * np.log(u))  # inverse cdf rayleigh distribution
-            q_ = 1.0 - b
+@njit(parallel=True, cache=True)
+def axis_ratio_rayleigh(sigma, q_min=0.2, q_max=1.0):
+    """
+    Function to sample axis ratio from rayleigh distribution with given velocity dispersion.
 
-            # selecting only q that is within the range
-            idx2 = (q_ >= q_min) & (q_ <= q_max)
-            q[idx[idx2]] = q_[idx2]
+    Parameters
+    ----------
+    sigma : `float: array`
+        velocity dispersion of the lens galaxy
+
+    Returns
+    -------
+    q : `float: array`
+        axis ratio of the lens galaxy
+    """
 
-            # remaining idx from the original array
-            # that still not have axis ratio above q_min
-            idx = idx[(q_ <= q_min) | (q_ >= q_max)]
+    size = len(sigma)
+    q = np.empty(size)
 
-            size_ = len(idx)
+    for i in prange(size):
+        # Draw the axis ratio see Appendix of https://arxiv.org/pdf/1807.07062.pdf
+        s = 0.38 - 0.09177 * sigma[i] / 161.0
+        if s <= 0:
+            s = 0.0001
+        # redraw only if q is outside the range
+        while True:
+            u = 1.0 - np.random.random()  # in (0, 1], avoids log(0)
+            q_ = 1.0 - s * np.sqrt(-2.0 * np.log(u))  # inverse cdf rayleigh distribution
+            if (q_ >= q_min) and (q_ <= q_max):
+                break
+        q[i] = q_
 
-        return q
+    return q
 
-@njit
-def velocity_dispersion_z_dependent(size, zl, zl_list, vd_inv_cdf):
+@njit(parallel=True, cache=True)
+def velocity_dispersion_z_dependent(size, zl, zl_list, vd_quantile_table, uniform_grid=False):
     """
     Function to sample velocity dispersion from the interpolator
 
@@ -198,6 +241,13 @@ def velocity_dispersion_z_dependent(size, zl, zl_list, vd_inv_cdf):
         Number of samples to draw
     zl: `numpy.ndarray` (1D array of float of size=size)
         Redshift of the lens galaxy
+    zl_list: `numpy.ndarray` (1D array of float)
+        Redshift grid on which the inverse cdfs are tabulated
+    vd_quantile_table: `numpy.ndarray` (2D array of float, shape=(len(zl_list), k))
+        velocity dispersion at the quantiles u = 1-(1-t)**VD_QUANTILE_POWER with t = np.linspace(0, 1, k), for each redshift in zl_list. The quantiles are dense near u=1, so that the high velocity dispersion tail is resolved. float32 tables are supported, the samples are always float64.
+    uniform_grid: `bool`
+        if True, zl_list is uniformly spaced and the redshift bin is found by integer arithmetic instead of a binary search
+        default: False
 
     Returns
     ----------
@@ -205,19 +255,173 @@ def velocity_dispersion_z_dependent(size, zl, zl_list, vd_inv_cdf):
         Samples of velocity dispersion
     """
 
-    index = np.searchsorted(zl_list, zl)
-    u = np.random.uniform(0, 1, size)
-    samples = np.zeros(size)
-        
+    # redshift bin of each lens, same as np.searchsorted(zl_list, zl) clipped to the last bin
+    n_z = len(zl_list)
+    if uniform_grid:
+        z0 = zl_list[0]
+        inv_dz = (n_z - 1) / (zl_list[-1] - z0)
+        index = np.empty(size, dtype=np.int64)
+        for i in prange(size):
+            j = min(max(int(np.ceil((zl[i] - z0) * inv_dz)), 0), n_z - 1)
+            # correct for round-off at the grid points
+            if j > 0 and zl_list[j - 1] >= zl[i]:
+                j -= 1
+            elif j < n_z - 1 and zl_list[j] < zl[i]:
+                j += 1
+            index[i] = j
+    else:
+        index = np.minimum(np.searchsorted(zl_list, zl), n_z - 1)
+    samples = np.empty(size)
+
+    # all the bins share the same quantile grid, which is uniform in t = 1-(1-u)**(1/VD_QUANTILE_POWER),
+    # so the inversion is a two-point gather and a linear interpolation
+    k = vd_quantile_table.shape[1] - 1
+    inv_power = 1.0 / VD_QUANTILE_POWER
+    if vd_quantile_table.size * vd_quantile_table.itemsize <= CACHE_BLOCK_BYTES:
+        u = np.random.uniform(0, 1, size)
+        for i in prange(size):
+            pos = (1.0 - (1.0 - u[i]) ** inv_power) * k
+            i0 = min(int(pos), k - 1)
+            x0 = vd_quantile_table[index[i], i0]
+            x1 = vd_quantile_table[index[i], i0 + 1]
+            samples[i] = x0 + (pos - i0) * (x1 - x0)
+        return samples
+
+    # the table does not fit in the cache, so the samples are grouped by redshift bin (counting sort)
+    # and each row of the table is read by one thread for all the samples of its bin
+    starts = np.zeros(n_z + 1, dtype=np.int64)
+    for i in range(size):
+        starts[index[i] + 1] += 1
+    starts = np.cumsum(starts)
+    order = np.empty(size, dtype=np.int64)
+    fill = starts[:-1].copy()
     for i in range(size):
-        cdf, x = vd_inv_cdf[index[i],0], vd_inv_cdf[index[i],1]
-        idx = np.searchsorted(cdf, u[i])  # vd cdf
-        x1, x0, y1, y0 = cdf[idx], cdf[idx-1], x[idx], x[idx-1]
-        samples[i] = y0 + (y1 - y0) * (u[i] - x0) / (x1 - x0)
+        order[fill[index[i]]] = i
+        fill[index[i]] += 1
+
+    for b in prange(n_z):
+        row = vd_quantile_table[b]
+        for j in range(starts[b], starts[b + 1]):
+            pos = (1.0 - (1.0 - np.random.random()) ** inv_power) * k
+            i0 = min(int(pos), k - 1)
+            samples[order[j]] = row[i0] + (pos - i0) * (row[i0 + 1] - row[i0])
 
     return samples
 
-@njit
+@njit(cache=True)
+def alias_table(weights):
+    """
+    Function to build the alias table of a discrete distribution with Vose's method.
+
+    Parameters
+    ----------
+    weights: `numpy.ndarray` (1D array of float)
+        unnormalized weights of the discrete distribution
+
+    Returns
+    ----------
+    prob: `numpy.ndarray` (1D array of float)
+        probability of keeping the drawn index
+    alias: `numpy.ndarray` (1D array of int)
+        index to use if the drawn index is not kept
+    """
+
+    n = len(weights)
+    p = weights * n / np.sum(weights)
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = np.empty(n, dtype=np.int64)
+    large = np.empty(n, dtype=np.int64)
+    n_small, n_large = 0, 0
+    for i in range(n):
+        if p[i] < 1.0:
+            small[n_small] = i
+            n_small += 1
+        else:
+            large[n_large] = i
+            n_large += 1
+
+    while n_small > 0 and n_large > 0:
+        n_small -= 1
+        s = small[n_small]
+        n_large -= 1
+        l = large[n_large]
+        prob[s] = p[s]
+        alias[s] = l
+        p[l] = p[l] + p[s] - 1.0
+        if p[l] < 1.0:
+            small[n_small] = l
+            n_small += 1
+        else:
+            large[n_large] = l
+            n_large += 1
+
+    return prob, alias
+
+@njit(cache=True)
+def alias_sampler(size, prob, alias):
+    """
+    Function to draw indices from the alias table of a discrete distribution. Each draw uses two random numbers and no rejection.
+
+    Parameters
+    ----------
+    size: `int`
+        Number of samples to draw
+    prob: `numpy.ndarray` (1D array of float)
+        probability of keeping the drawn index, from alias_table
+    alias: `numpy.ndarray` (1D array of int)
+        index to use if the drawn index is not kept, from alias_table
+
+    Returns
+    ----------
+    idx: `numpy.ndarray` (1D array of int)
+        drawn indices
+    """
+
+    n = len(prob)
+    idx = np.empty(size, dtype=np.int64)
+    for i in range(size):
+        j = np.random.randint(0, n)
+        if np.random.random() < prob[j]:
+            idx[i] = j
+        else:
+            idx[i] = alias[j]
+    return idx
+
+@njit(cache=True)
+def einstein_radius_SIS(sigma, zl, zs, splineDc):
+    """
+    Function to compute the Einstein radius of the SIS lens. In a flat universe, Dls/Ds = 1 - Dc(zl)/Dc(zs), so only the comoving distances of the lens and the source are interpolated.
+
+    Parameters
+    ----------
+    sigma: `numpy.ndarray` (1D array of float)
+        velocity dispersion of the lens galaxy, in km/s
+    zl: `numpy.ndarray` (1D array of float)
+        redshift of the lens galaxy
+    zs: `numpy.ndarray` (1D array of float)
+        redshift of the source
+    splineDc: `numpy.ndarray`
+        spline coefficients and redshifts of the comoving distance
+
+    Returns
+    ----------
+    theta_E: `numpy.ndarray` (1D array of float)
+        Einstein radius in radian
+
+    Notes
+    ----------
+    Assumes a flat universe, where Dls/Ds = 1 - Dc(zl)/Dc(zs). Callers fall back to the astropy distances otherwise.
+    """
+
+    Dc_l = cubic_spline_interpolator(zl, splineDc[0], splineDc[1])
+    Dc_s = cubic_spline_interpolator(zs, splineDc[0], splineDc[1])
+    # Dls = (Dc_s - Dc_l)/(1+zs) and Ds = Dc_s/(1+zs)
+    Dls_Ds = 1.0 - Dc_l / Dc_s
+
+    return FOURPI_OVER_C2 * sigma * sigma * Dls_Ds
+
+@njit(cache=True)
 def lens_redshift_SDSS_catalogue(zs, splineDc, splineDcInv, u, cdf):
     """
     Function to sample lens redshift from the SDSS catalogue.
@@ -248,12 +452,12 @@ def lens_redshift_SDSS_catalogue(zs, splineDc, splineDcInv, u, cdf):
     splineDcInv_z_list = splineDcInv[1]
 
     size = len(zs)
-    r = inverse_transform_sampler(size, cdf, u)
+    r = np.interp(np.random.random(size), cdf, u)
     lens_galaxy_Dc = cubic_spline_interpolator(zs, splineDc_coeff, splineDc_z_list) * r  # corresponding element-wise multiplication between 2 arrays
 
     return cubic_spline_interpolator(lens_galaxy_Dc, splineDcInv_coeff, splineDcInv_z_list)
 
-@njit
+@njit(cache=True)
 def bounded_normal_sample(size, mean, std, low, high):
     """
     Function to sample from a normal distribution with bounds.
@@ -279,9 +483,90 @@ def bounded_normal_sample(size, mean, std, low, high):
     return samples
 
 
-@njit()
+@njit(cache=True)
+def uniform_sampler(size, low, high):
+    """
+    Function to sample from a uniform distribution with numba's generator, the same one the other njit samplers draw from.
+
+    Parameters
+    ----------
+    size: `int`
+        Number of samples to draw
+    low: `float`
+        Lower bound of the uniform distribution
+    high: `float`
+        Upper bound of the uniform distribution
+
+    Returns
+    ----------
+    samples: `numpy.ndarray` (1D array of float of size=size)
+        Samples from the uniform distribution
+    """
+
+    return np.random.uniform(low, high, size)
+
+@njit(parallel=True, cache=True)
+def normal_sampler(size, mean, std):
+    """
+    Function to sample from a normal distribution with the Box-Muller transform. Each pair of uniform draws gives two normal samples.
+
+    Parameters
+    ----------
+    size: `int`
+        Number of samples to draw
+    mean: `float`
+        Mean of the normal distribution
+    std: `float`
+        Standard deviation of the normal distribution
+
+    Returns
+    ----------
+    samples: `numpy.ndarray` (1D array of float of size=size)
+        Samples from the normal distribution
+    """
+
+    n_pairs = (size + 1) // 2
+    samples = np.empty(2 * n_pairs)
+    for i in prange(n_pairs):
+        r = std * np.sqrt(-2.0 * np.log(1.0 - np.random.random()))
+        theta = 2.0 * np.pi * np.random.random()
+        samples[2 * i] = mean + r * np.cos(theta)
+        samples[2 * i + 1] = mean + r * np.sin(theta)
+    return samples[:size]
+
+@njit(parallel=True, cache=True)
+def shear_norm_sampler(size, scale):
+    """
+    Function to sample the two external shear components from a zero mean normal distribution. Both components come from the same Box-Muller pair.
+
+    Parameters
+    ----------
+    size: `int`
+        Number of samples to draw
+    scale: `float`
+        Standard deviation of the normal distribution
+
+    Returns
+    ----------
+    gamma_1: `numpy.ndarray` (1D array of float of size=size)
+        shear component in the x-direction
+    gamma_2: `numpy.ndarray` (1D array of float of size=size)
+        shear component in the y-direction
+    """
+
+    gamma_1 = np.empty(size)
+    gamma_2 = np.empty(size)
+    for i in prange(size):
+        r = scale * np.sqrt(-2.0 * np.log(1.0 - np.random.random()))
+        theta = 2.0 * np.pi * np.random.random()
+        gamma_1[i] = r * np.cos(theta)
+        gamma_2[i] = r * np.sin(theta)
+    return gamma_1, gamma_2
+
+
+@njit(parallel=True, fastmath=True, cache=True)
 def phi_q2_ellipticity_hemanta(phi, q):
-    """Function to convert phi and q to ellipticity e1 and e2.
+    """Function to convert phi and q to ellipticity e1 and e2. Both components are computed in a single pass over the inputs.
 
     Parameters
     ----------
@@ -297,10 +582,57 @@ def phi_q2_ellipticity_hemanta(phi, q):
     e2 : `float: array`
     """
 
-    e_1 = (1.0 - q) / (1.0 + q) * np.cos(2 * phi)
-    e_2 = (1.0 - q) / (1.0 + q) * np.sin(2 * phi)
+    size = len(phi)
+    e_1 = np.empty(size)
+    e_2 = np.empty(size)
+    for i in prange(size):
+        f = (1.0 - q[i]) / (1.0 + q[i])
+        e_1[i] = f * np.cos(2.0 * phi[i])
+        e_2[i] = f * np.sin(2.0 * phi[i])
     return e_1, e_2
     
+@njit(parallel=True, cache=True)
+def epl_shear_params_sampler(q, phi_min, phi_max, shear_scale, gamma_mean, gamma_std):
+    """
+    Function to sample the axis rotation angle, ellipticities, shears and the mass density spectral index of the EPL+shear lens in a single pass. It is equivalent to the default axis_rotation_angle_uniform, shear_norm and mass_density_spectral_index_normal samplers together with phi_q2_ellipticity_hemanta.
+
+    Parameters
+    ----------
+    q : `float: array`
+        axis ratio of the lens galaxy
+    phi_min, phi_max : `float`, `float`
+        range of the uniform axis rotation angle
+    shear_scale : `float`
+        standard deviation of the zero mean normal distribution of the shear components
+    gamma_mean, gamma_std : `float`, `float`
+        mean and standard deviation of the normal distribution of the mass density spectral index
+
+    Returns
+    -------
+    phi, e1, e2, gamma1, gamma2, gamma : `float: array`
+        axis rotation angle, ellipticity components, shear components and mass density spectral index
+    """
+
+    size = len(q)
+    phi = np.empty(size)
+    e1 = np.empty(size)
+    e2 = np.empty(size)
+    gamma1 = np.empty(size)
+    gamma2 = np.empty(size)
+    gamma = np.empty(size)
+    for i in prange(size):
+        phi[i] = np.random.uniform(phi_min, phi_max)
+        f = (1.0 - q[i]) / (1.0 + q[i])
+        e1[i] = f * np.cos(2.0 * phi[i])
+        e2[i] = f * np.sin(2.0 * phi[i])
+        # Box-Muller pair for the two shear components
+        r = shear_scale * np.sqrt(-2.0 * np.log(1.0 - np.random.random()))
+        theta = 2.0 * np.pi * np.random.random()
+        gamma1[i] = r * np.cos(theta)
+        gamma2[i] = r * np.sin(theta)
+        gamma[i] = np.random.normal(gamma_mean, gamma_std)
+    return phi, e1, e2, gamma1, gamma2, gamma
+
 def epl_shear_area(zl, zs):
 
     size=10000
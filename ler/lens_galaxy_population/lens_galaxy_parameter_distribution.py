@@ -9,18 +9,17 @@ import warnings
 warnings.filterwarnings("ignore")
 import numpy as np
 from numba import njit
-from scipy.integrate import quad
+from scipy.integrate import trapezoid
 # from lenstronomy.Util.param_util import phi_q2_ellipticity
 
 # for redshift to luminosity distance conversion
-from astropy.cosmology import LambdaCDM
 
 # the following .py file will be called if they are not given in the class initialization
 from ..gw_source_population import CBCSourceParameterDistribution
 from .optical_depth import OpticalDepth
 from ..image_properties import ImageProperties
-from ..utils import add_dictionaries_together, trim_dictionary
-from .jit_functions import phi_cut_SIE, velocity_dispersion_z_dependent, lens_redshift_SDSS_catalogue, phi_q2_ellipticity_hemanta
+from ..utils import create_inv_cdf_array, inverse_transform_sampler, default_cosmology, seed_numba_rng
+from .jit_functions import cross_section_SIE, lens_redshift_SDSS_catalogue, phi_q2_ellipticity_hemanta, shear_norm_sampler, normal_sampler, uniform_sampler, epl_shear_params_sampler, einstein_radius_SIS, alias_table, alias_sampler, FOURPI_OVER_C2
 
 
 class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImageProperties, OpticalDepth):
@@ -56,6 +55,9 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
     directory : `str`
         directory to store the interpolators
         default: './interpolator_pickle'
+    seed : `int`
+        seed of numba's random number generator, which all the lens parameter samplers and rejection steps draw from. numba's generator is global to the process, so the seed of the last instance created applies to all the instances. The draws of the samplers with parallel loops are only reproducible when numba runs single-threaded (see :func:`~ler.utils.utils.seed_numba_rng`).
+        default: None
     **kwargs : 
         keyword arguments to pass to the parent classes
 
@@ -209,6 +211,26 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
     normalization constant of the pdf p(z)
     """
 
+    lens_redshift_inv_cdf = None
+    """`numpy.ndarray`\n
+    cdf values and the corresponding fractional comoving distance of the lens, Dc(zl)/Dc(zs), used for sampling lens redshifts
+    """
+
+    optical_depth_table = None
+    """`numpy.ndarray`\n
+    source redshifts and the corresponding strong lensing optical depth, tabulated between z_min and z_max
+    """
+
+    zs_sl_inv_cdf = None
+    """`numpy.ndarray`\n
+    cdf values and source redshifts of the pdf p(z)*tau(z), used for sampling strongly lensed source redshifts
+    """
+
+    max_batch_size = 1000000
+    """`int`\n
+    maximum number of lens parameters drawn per batch of the rejection sampling in sample_all_routine
+    """
+
     def __init__(
         self,
         npool=4,
@@ -222,13 +244,17 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         lens_priors_params=None,
         directory="./interpolator_pickle",
         create_new_interpolator=False,
+        seed=None,
         **kwargs
     ):
         
         self.npool = npool
+        if seed is not None:
+            # all the draws go through numba's generator, which is global to the process
+            seed_numba_rng(seed)
         self.z_min = z_min
         self.z_max = z_max
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         self.event_type = event_type
         self.directory = directory
         # initialize the interpolator's parameters
@@ -271,11 +297,17 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         # initializing parent classes
         self.class_initialization_lens(params=kwargs);
 
+        # cdf of the fractional comoving distance of the lens, r=Dc(zl)/Dc(zs). It doesn't depend on zs, so it is tabulated only once
+        # See the integral of Eq. A7 of https://arxiv.org/pdf/1807.07062.pdf (cdf)
+        u = np.linspace(0, 1, 500)
+        self.lens_redshift_inv_cdf = np.array([10 * u**3 - 15 * u**4 + 6 * u**5, u])
+
         # initializing samplers
         # self.sample_velocity_dispersion and self.sample_axis_ratio are initialized in OpticalDepth class
         self.sample_source_redshift_sl = self.lens_param_samplers["source_redshift_sl"]
         self.sample_lens_redshift = self.lens_param_samplers["lens_redshift"]
         # self.sample_axis_ratio = self.lens_param_samplers["axis_ratio"]
+        self._lens_prior_names = {}  # names of the samplers set by name through the setters, used by fused_lens_sampler
         self.sample_axis_rotation_angle = self.lens_param_samplers[
             "axis_rotation_angle"
         ]
@@ -285,23 +317,19 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         ]
         self.sample_source_parameters = self.lens_param_samplers["source_parameters"]
 
-        # extra care to the velocity dispersion sampler
-        if self.lens_param_samplers["velocity_dispersion"]  == "velocity_dispersion_ewoud":
-            vd_inv_cdf = self.vd_inv_cdf
-            zl_list = self.zl_list
-            self.sample_velocity_dispersion = lambda size, zl: velocity_dispersion_z_dependent(size=size, zl=zl, zl_list=zl_list, vd_inv_cdf=vd_inv_cdf)
-
         # To find the normalization constant of the pdf p(z)
         # this under the assumption that the event is strongly lensed
-        # Define the merger-rate density function
-        pdf_unnormalized_ = lambda z: self.merger_rate_density_detector_frame(np.array([z]), param=self.merger_rate_density_param) * self.strong_lensing_optical_depth(np.array([z]))
-        pdf_unnormalized = lambda z: pdf_unnormalized_(z)[0]
-
-        self.normalization_pdf_z_lensed = quad(
-            pdf_unnormalized,
-            self.z_min,
-            self.z_max
-        )[0]
+        # merger_rate_density_detector_frame and strong_lensing_optical_depth take arrays as input, so the integrand is evaluated on a grid in one go
+        resolution = self.create_new_interpolator["redshift_distribution"]["resolution"]
+        zs_grid = np.linspace(self.z_min, self.z_max, resolution)
+        # optical depth is tabulated once, and reused by the rejection sampler in strongly_lensed_source_redshifts
+        self.optical_depth_table = np.array([zs_grid, self.strong_lensing_optical_depth(zs_grid)])
+        pdf_unnormalized = self.merger_rate_density_detector_frame(zs_grid, param=self.merger_rate_density_param) * self.optical_depth_table[1]
+        self.normalization_pdf_z_lensed = trapezoid(pdf_unnormalized, zs_grid)
+
+        # inverse cdf of p(z)*tau(z) for sampling strongly lensed source redshifts directly
+        # it is used only when the source redshift sampler is not overridden by the user
+        self.zs_sl_inv_cdf = create_inv_cdf_array(zs_grid, pdf_unnormalized/self.normalization_pdf_z_lensed)
 
     def class_initialization_lens(self, params=None):
         """
@@ -487,133 +515,7 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             size=size, lens_parameters_input=lens_parameters_input
         )
 
-    def sample_all_routine_SIE(self, size=1000, lens_parameters_input=None):
-        """
-        Function to sample galaxy lens parameters along with the source parameters.
-
-        Parameters
-        ----------
-        size : `int`
-            number of lens parameters to sample
-        lens_parameters_input : `dict`
-            dictionary of lens parameters to sample
-
-        Returns
-        -------
-        lens_parameters : `dict`
-            dictionary of lens parameters and source parameters (lens conditions applied): \n
-            zl: lens redshifts \n
-            zs: source redshifts, lensed condition applied\n
-            sigma: velocity dispersions \n
-            q: axis ratios \n
-            theta_E: Einstein radii \n
-            phi: axis rotation angle \n
-            e1: ellipticity component 1 \n
-            e2: ellipticity component 2 \n
-            gamma1: shear component 1 \n
-            gamma2: shear component 2 \n
-            gamma: spectral index of the mass density distribution \n
-            geocent_time: time of arrival of the unlensed signal\n
-            phase: phase of the unlensed signal\n
-            psi: polarization angle of the unlensed signal\n
-            theta_jn: inclination angle of the unlensed signal\n
-            luminosity_distance: luminosity distance of the source\n
-            mass_1_source: mass 1 (larger) of the source\n
-            mass_2_source: mass 2 (smaller) of the source\n
-            ra: right ascension of the source\n
-            dec: declination of the source\n
-
-        Examples
-        --------
-        >>> from ler.lens_galaxy_population import LensGalaxyParameterDistribution
-        >>> lens = LensGalaxyParameterDistribution()
-        >>> lens.sample_all_routine(size=1000)
-        """
-
-        if lens_parameters_input is None:
-            lens_parameters_input = dict()
-        samplers_params = self.lens_param_samplers_params.copy()
-
-        # Sample source redshifts from the source population
-        # rejection sampled with optical depth
-        zs = self.sample_source_redshift_sl(size=size)
-
-        # Sample lens redshifts
-        zl = self.sample_lens_redshift(zs=zs)
-
-        # Sample velocity dispersions
-        try:
-            sigma = self.sample_velocity_dispersion(len(zs))
-        except:
-            sigma = self.sample_velocity_dispersion(len(zs), zl)
-
-        # Sample axis ratios
-        try:
-            q = self.sample_axis_ratio(sigma)
-        except:
-            q = self.sample_axis_ratio(len(sigma))
-
-        # Compute the Einstein radii
-        theta_E = self.compute_einstein_radii(sigma, zl, zs)
-
-        # Create a dictionary of the lens parameters
-        lens_parameters = {
-            "zl": zl,
-            "zs": zs,
-            "sigma": sigma,
-            "q": q,
-            "theta_E": theta_E,
-        }
-
-        # Rejection sample based on the lensing probability, that is, rejection sample wrt theta_E
-        lens_parameters = self.rejection_sample_sl(
-            lens_parameters
-        )  # proportional to pi theta_E^2
-
-        # Add the lensing parameter dictionaries together
-        lens_parameters = add_dictionaries_together(
-            lens_parameters, lens_parameters_input
-        )
-
-        # check the size of the lens parameters
-        if len(lens_parameters["zl"]) < size:
-            # Run iteratively until we have the right number of lensing parmaeters
-            # print("current sampled size", len(lens_parameters["zl"]))
-            return self.sample_all_routine(
-                size=size, lens_parameters_input=lens_parameters
-            )
-        else:
-            # Trim dicitionary to right size
-            lens_parameters = trim_dictionary(lens_parameters, size)
-
-            # Sample the axis rotation angle
-            lens_parameters["phi"] = self.sample_axis_rotation_angle(size=size)
-
-            # Transform the axis ratio and the angle, to ellipticities e1, e2, using lenstronomy
-            lens_parameters["e1"], lens_parameters["e2"] = phi_q2_ellipticity_hemanta(
-                lens_parameters["phi"], lens_parameters["q"]
-            )
-
-            # Sample shears
-            lens_parameters["gamma1"], lens_parameters["gamma2"] = self.sample_shear(
-                size=size)
-
-            # Sample the spectral index of the mass density distribution
-            lens_parameters["gamma"] = self.sample_mass_density_spectral_index(
-                size=size)
-
-            # sample gravitional waves source parameter
-            param = dict(zs=lens_parameters["zs"])
-            if samplers_params["source_parameters"]:
-                param.update(self.sample_gw_parameters(size=size))
-            gw_param = self.sample_source_parameters(size=size, param=param)
-
-            # Add source params strongly lensed to the lens params
-            lens_parameters.update(gw_param)
-
-            return lens_parameters
-        
-    def sample_all_routine_SIE(self, size=1000, lens_parameters_input=None):
+    def sample_all_routine(self, size=1000, lens_parameters_input=None):
         """
         Function to sample galaxy lens parameters along with the source parameters.
 
@@ -622,7 +524,7 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         size : `int`
             number of lens parameters to sample
         lens_parameters_input : `dict`
-            dictionary of lens parameters to sample
+            dictionary of already sampled lens parameters (zl, zs, sigma, q, theta_E), with the lensing condition applied. Only the remaining size-len(lens_parameters_input['zl']) parameters are sampled.
 
         Returns
         -------
@@ -660,58 +562,90 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             lens_parameters_input = dict()
         samplers_params = self.lens_param_samplers_params.copy()
 
-        # Sample source redshifts from the source population
-        # rejection sampled with optical depth
-        zs = self.sample_source_redshift_sl(size=size)
-
-        # Sample lens redshifts
-        zl = self.sample_lens_redshift(zs=zs)
-
-        # Sample velocity dispersions
-        try:
-            sigma = self.sample_velocity_dispersion(len(zs))
-        except:
-            sigma = self.sample_velocity_dispersion(len(zs), zl)
-
-        # Sample axis ratios
-        try:
-            q = self.sample_axis_ratio(sigma)
-        except:
-            q = self.sample_axis_ratio(len(sigma))
-
-        # Compute the Einstein radii
-        theta_E = self.compute_einstein_radii(sigma, zl, zs)
-
-        # Create a dictionary of the lens parameters
-        lens_parameters = {
-            "zl": zl,
-            "zs": zs,
-            "sigma": sigma,
-            "q": q,
-            "theta_E": theta_E,
-        }
-
-        # Rejection sample based on the lensing probability, that is, rejection sample wrt theta_E
-        lens_parameters = self.rejection_sample_sl(
-            lens_parameters
-        )  # proportional to pi theta_E^2
-
-        # Add the lensing parameter dictionaries together
-        lens_parameters = add_dictionaries_together(
-            lens_parameters, lens_parameters_input
-        )
-
-        # check the size of the lens parameters
-        if len(lens_parameters["zl"]) < size:
-            # Run iteratively until we have the right number of lensing parmaeters
-            # print("current sampled size", len(lens_parameters["zl"]))
-            return self.sample_all_routine(
-                size=size, lens_parameters_input=lens_parameters
+        # lens parameters that are rejection sampled, filled batch by batch
+        # one contiguous block, each parameter is a row of it
+        keys = ["zl", "zs", "sigma", "q", "theta_E"]
+        lens_parameters_block = np.empty((len(keys), size))
+        lens_parameters = {key: lens_parameters_block[i] for i, key in enumerate(keys)}
+        n = 0
+        if lens_parameters_input:
+            n = min(len(lens_parameters_input["zl"]), size)
+            for key in keys:
+                lens_parameters[key][:n] = lens_parameters_input[key][:n]
+
+        # resolve the samplers once, outside the rejection loop
+        sample_source_redshift_sl = self.sample_source_redshift_sl
+        sample_lens_redshift = self.sample_lens_redshift
+        sample_velocity_dispersion = self.sample_velocity_dispersion
+        sample_axis_ratio = self.sample_axis_ratio
+        compute_einstein_radii = self.compute_einstein_radii
+        rejection_sample_sl = self.rejection_sample_sl
+        vd_is_z_dependent = self.vd_is_z_dependent
+
+        max_batch_size = self.max_batch_size
+        batch_size = min(size - n, max_batch_size)
+        n_drawn, n_kept = 0, 0  # for the acceptance rate of the lensing condition
+        while n < size:
+            # Sample source redshifts from the source population
+            # rejection sampled with optical depth
+            zs = sample_source_redshift_sl(size=batch_size)
+
+            # Sample lens redshifts
+            zl = sample_lens_redshift(zs=zs)
+
+            # Sample velocity dispersions
+            if vd_is_z_dependent:
+                sigma = sample_velocity_dispersion(len(zs), zl)
+            else:
+                sigma = sample_velocity_dispersion(len(zs))
+
+            # Sample axis ratios
+            try:
+                q = sample_axis_ratio(sigma)
+            except (TypeError, ValueError):
+                # samplers that only take the size
+                q = sample_axis_ratio(len(sigma))
+
+            # Compute the Einstein radii
+            theta_E = compute_einstein_radii(sigma, zl, zs)
+
+            # Rejection sample based on the lensing probability, that is, rejection sample wrt theta_E
+            accepted = rejection_sample_sl(
+                dict(zl=zl, zs=zs, sigma=sigma, q=q, theta_E=theta_E)
+            )  # proportional to pi theta_E^2
+
+            # fill the accepted parameters
+            n_accepted = len(accepted["zl"])
+            n_fill = min(n_accepted, size - n)
+            for key in keys:
+                lens_parameters[key][n:n + n_fill] = accepted[key][:n_fill]
+            n += n_fill
+
+            # oversample the next batch according to the acceptance rate accumulated over all batches, with 20% safety margin
+            # the batch is capped, so that a low acceptance rate does not blow up the memory
+            n_drawn += batch_size
+            n_kept += n_accepted
+            acceptance_rate = max(n_kept, 1) / n_drawn
+            batch_size = min(int((size - n) / acceptance_rate * 1.2) + 1, max_batch_size)
+
+        if self.fused_lens_sampler:
+            # axis rotation angle, ellipticities, shears and spectral index in a single pass
+            (
+                lens_parameters["phi"],
+                lens_parameters["e1"],
+                lens_parameters["e2"],
+                lens_parameters["gamma1"],
+                lens_parameters["gamma2"],
+                lens_parameters["gamma"],
+            ) = epl_shear_params_sampler(
+                lens_parameters["q"],
+                samplers_params["axis_rotation_angle"]["phi_min"],
+                samplers_params["axis_rotation_angle"]["phi_max"],
+                samplers_params["shear"]["scale"],
+                samplers_params["mass_density_spectral_index"]["mean"],
+                samplers_params["mass_density_spectral_index"]["std"],
             )
         else:
-            # Trim dicitionary to right size
-            lens_parameters = trim_dictionary(lens_parameters, size)
-
             # Sample the axis rotation angle
             lens_parameters["phi"] = self.sample_axis_rotation_angle(size=size)
 
@@ -728,20 +662,20 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             lens_parameters["gamma"] = self.sample_mass_density_spectral_index(
                 size=size)
 
-            # sample gravitional waves source parameter
-            param = dict(zs=lens_parameters["zs"])
-            if samplers_params["source_parameters"]:
-                param.update(self.sample_gw_parameters(size=size))
-            gw_param = self.sample_source_parameters(size=size, param=param)
+        # sample gravitional waves source parameter
+        param = dict(zs=lens_parameters["zs"])
+        if samplers_params["source_parameters"]:
+            param.update(self.sample_gw_parameters(size=size))
+        gw_param = self.sample_source_parameters(size=size, param=param)
 
-            # Add source params strongly lensed to the lens params
-            lens_parameters.update(gw_param)
+        # Add source params strongly lensed to the lens params
+        lens_parameters.update(gw_param)
 
-            return lens_parameters
+        return lens_parameters
 
     def strongly_lensed_source_redshifts(self, size=1000):
         """
-        Function to sample source redshifts and other parameters, conditioned on the source being strongly lensed.
+        Function to sample source redshifts and other parameters, conditioned on the source being strongly lensed. If the source redshift sampler is the default one, the redshifts are drawn directly from the inverse cdf of p(z)*tau(z). Otherwise, rejection sampling wrt the optical depth is used.
 
         Parameters
         ----------
@@ -760,32 +694,27 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         >>> lens.strongly_lensed_source_redshifts(size=1000)
         """
 
-        z_max = self.z_max
+        # default sampler: p(z)*tau(z) is tabulated in __init__
+        if self.sample_zs is self.sample_source_redshift:
+            return inverse_transform_sampler(size, self.zs_sl_inv_cdf[0], self.zs_sl_inv_cdf[1])
 
-        def zs_function(zs_sl):
+        # user defined sampler: rejection sampling with the optical depth
+        zs_table, tau_table = self.optical_depth_table
+        tau_max = np.max(tau_table) # tau increases with z
+        zs_sl = np.empty(size)
+        n = 0  # write cursor
+        while n < size:
             # get zs
-            # self.sample_source_redshifts from CBCSourceRedshiftDistribution class
             zs = self.sample_zs(size)  # this function is from CBCSourceParameterDistribution class
             # put strong lensing condition with optical depth
-            tau = self.strong_lensing_optical_depth(zs)
-            tau_max = self.strong_lensing_optical_depth(np.array([z_max]))[0] # tau increases with z
-            r = np.random.uniform(0, tau_max, size=len(zs)) 
-            # Add the strongly lensed source redshifts to the list
-            # pick strongly lensed sources
-            zs_sl += list(zs[r < tau])  # list concatenation
-
-            # Check if the zs_sl are larger than requested size
-            if len(zs_sl) >= size:
-                # Trim list to right size
-                zs_sl = zs_sl[:size]
-                return zs_sl
-            else:
-                # Run iteratively until we have the right number of lensing parmaeters
-                return zs_function(zs_sl)
-
-        zs_sl = []
+            tau = np.interp(zs, zs_table, tau_table)
+            r = uniform_sampler(len(zs), 0.0, tau_max)
+            # pick strongly lensed sources, only as many as needed
+            zs = zs[r < tau][:size - n]
+            zs_sl[n:n + len(zs)] = zs
+            n += len(zs)
 
-        return np.array(zs_function(zs_sl))
+        return zs_sl
 
     def source_parameters(self, size, get_attribute=False, param=None):
         """
@@ -843,8 +772,7 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
         splineDc = self.splineDc  # spline coefficients for the comoving distance and redshifts
         splineDcInv = self.splineDcInv  # spline coefficients for the redshifts and comoving distance
-        u = np.linspace(0, 1, 500)
-        cdf = (10 * u**3 - 15 * u**4 + 6 * u**5)  # See the integral of Eq. A7 of https://arxiv.org/pdf/1807.07062.pdf (cdf)
+        cdf, u = self.lens_redshift_inv_cdf  # cached in __init__
         zs = np.array([zs]).reshape(-1)
 
         # lens redshifts
@@ -891,10 +819,10 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             phi_max = param["phi_max"]
 
         if get_attribute:
-            return njit(lambda size: np.random.uniform(phi_min, phi_max, size=size))
+            return njit(lambda size: uniform_sampler(size, phi_min, phi_max))
         else:
             # Draw the angles from a uniform distribution
-            return np.random.uniform(phi_min, phi_max, size=size)
+            return uniform_sampler(size, phi_min, phi_max)
 
     def shear_norm(self, size, scale=0.05, get_attribute=False, param=None):
         """
@@ -930,10 +858,10 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             scale = param["scale"]
 
         if get_attribute:
-            return njit(lambda size: np.random.normal(loc=0, scale=scale,size=(2,size)))
+            return njit(lambda size: shear_norm_sampler(size, scale))
         else:
             # Draw an external shear from a normal distribution
-            return np.random.normal(loc=0., scale=scale,size=(2,size))
+            return shear_norm_sampler(size, scale)
 
     def mass_density_spectral_index_normal(
         self, size=1000, mean=2.0, std=0.2, get_attribute=False, param=None
@@ -970,10 +898,10 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
             std = param["std"]
 
         if get_attribute:
-            return njit(lambda size: np.random.normal(loc=mean, scale=std, size=size))
+            return njit(lambda size: normal_sampler(size, mean, std))
         else:
             # Draw the spectral index from a normal distribution
-            return np.random.normal(loc=mean, scale=std, size=size)
+            return normal_sampler(size, mean, std)
 
     def compute_einstein_radii(self, sigma, zl, zs):
         """
@@ -1003,13 +931,16 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         >>> lens.compute_einstein_radii(sigma, zl, zs)
         """
 
-        # Compute the angular diameter distances
-        Ds = self.angular_diameter_distance(zs)
-        Dls = self.angular_diameter_distance_z1z2(zl, zs)
         # Compute the Einstein radii
-        theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / (Ds)
-        )  # Note: km/s for sigma; Dls, Ds are in Mpc
+        # Note: km/s for sigma
+        if self.cosmo.Ok0 == 0:
+            # flat universe, comoving distances from the cached spline coefficients
+            theta_E = einstein_radius_SIS(sigma, zl, zs, self.splineDc)
+        else:
+            # non-flat universe
+            Dls = self.angular_diameter_distance_z1z2(zl, zs)
+            Ds = self.angular_diameter_distance(zs)
+            theta_E = FOURPI_OVER_C2 * sigma * sigma * Dls / Ds
 
         return theta_E
 
@@ -1030,12 +961,13 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
         theta_E = param_dict["theta_E"]
         size = len(theta_E)
-        theta_E_max = np.max(theta_E)  # maximum einstein radius
-        u = np.random.uniform(0, theta_E_max**2, size=size)
-        mask = u < theta_E**2
+        cross_section = theta_E * theta_E  # np.pi is omitted
+        # indices of the accepted samples, found once and applied to every parameter
+        u = uniform_sampler(size, 0.0, np.max(cross_section))
+        idx = np.flatnonzero(u < cross_section)
 
         # return the dictionary with the mask applied
-        return {key: val[mask] for key, val in param_dict.items()}
+        return {key: val[idx] for key, val in param_dict.items()}
 
     def rjs_with_cross_section_SIE(self, param_dict):
         """
@@ -1054,15 +986,59 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
         theta_E = param_dict["theta_E"]
         q = param_dict["q"]
-        phi_cut = phi_cut_SIE(q)
         size = len(theta_E)
-        cross_section = theta_E**2 * phi_cut
-        max_ = np.max(cross_section)  # maximum einstein radius
-        u = np.random.uniform(0, max_, size=size)
-        mask = u < cross_section
+        cross_section, cross_section_max = cross_section_SIE(theta_E, q)
+        # indices of the accepted samples, found once and applied to every parameter
+        u = uniform_sampler(size, 0.0, cross_section_max)
+        idx = np.flatnonzero(u < cross_section)
 
         # return the dictionary with the mask applied
-        return {key: val[mask] for key, val in param_dict.items()}
+        return {key: val[idx] for key, val in param_dict.items()}
+
+    def resample_with_cross_section_SIE(self, param_dict):
+        """
+        Function to resample the lens parameters with weights proportional to the cross_section, using the alias method. Unlike the rejection sampling of rjs_with_cross_section_SIE, every draw is kept, so the output has the same size as the input. But a sample can be picked more than once, which is only a good approximation when the input batch is much larger than the number of distinct lenses needed.
+
+        Parameters
+        ----------
+        param_dict : `dict`
+            dictionary of lens parameters and source parameters
+
+        Returns
+        -------
+        lens_params : `dict`
+            dictionary of lens parameters after resampling
+        """
+
+        theta_E = param_dict["theta_E"]
+        q = param_dict["q"]
+        cross_section, _ = cross_section_SIE(theta_E, q)
+        prob, alias = alias_table(cross_section)
+        idx = alias_sampler(len(theta_E), prob, alias)
+
+        # return the dictionary with the resampled indices
+        return {key: val[idx] for key, val in param_dict.items()}
+
+    @property
+    def fused_lens_sampler(self):
+        """
+        True if the axis rotation angle, shear and mass density spectral index samplers are the default ones, in which case sample_all_routine samples phi, e1, e2, gamma1, gamma2 and gamma with one fused kernel. It is checked at every call, so a sampler replaced through the setters is always used.
+
+        Returns
+        -------
+        fused : `bool`
+            True if the fused kernel can be used.
+        """
+
+        default_priors = dict(
+            axis_rotation_angle="axis_rotation_angle_uniform",
+            shear="shear_norm",
+            mass_density_spectral_index="mass_density_spectral_index_normal",
+        )
+        return all(
+            (self._lens_prior_names.get(key) == name) and (self.lens_param_samplers_params[key] is not None)
+            for key, name in default_priors.items()
+        )
 
     @property
     def sample_source_redshift_sl(self):
@@ -1090,35 +1066,12 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_source_redshift_sl.setter
     def sample_source_redshift_sl(self, prior):
-        try:
-            self._sample_source_redshift_sl = getattr(self, prior)
-        except:
+        if isinstance(prior, str):
+            self._sample_source_redshift_sl = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["source_redshift_sl"])
+        elif callable(prior):
             self._sample_source_redshift_sl = prior
-
-    @property
-    def sample_source_parameters(self):
-        """
-        Function to sample source parameters conditioned on the source being strongly lensed
-
-        Parameters
-        ----------
-        size : `int`
-            number of lens parameters to sample
-
-        Returns
-        -------
-        source_parameters : `dict`
-            dictionary of source parameters conditioned on the source being strongly lensed
-        """
-        return self._sample_source_parameters
-    
-    @sample_source_parameters.setter
-    def sample_source_parameters(self, prior):
-        try:
-            args = self.lens_param_samplers_params["source_parameters"]
-            self._sample_source_parameters = getattr(self, prior)(size=None, get_attribute=True, param=args)
-        except:
-            self._sample_source_parameters = prior
+        else:
+            raise ValueError(f"sample_source_redshift_sl must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_lens_redshift(self):
@@ -1147,11 +1100,14 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_lens_redshift.setter
     def sample_lens_redshift(self, prior):
-        try:
+        if isinstance(prior, str):
             args = self.lens_param_samplers_params["lens_redshift"]
-            self._sample_lens_redshift = getattr(self, prior)(zs=None, get_attribute=True, param=args)
-        except:
+            sampler = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["lens_redshift"])
+            self._sample_lens_redshift = sampler(zs=None, get_attribute=True, param=args)
+        elif callable(prior):
             self._sample_lens_redshift = prior
+        else:
+            raise ValueError(f"sample_lens_redshift must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_axis_rotation_angle(self):
@@ -1178,11 +1134,16 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_axis_rotation_angle.setter
     def sample_axis_rotation_angle(self, prior):
-        try:
+        if isinstance(prior, str):
             args = self.lens_param_samplers_params["axis_rotation_angle"]
-            self._sample_axis_rotation_angle = getattr(self, prior)(size=None, get_attribute=True, param=args)
-        except:
+            sampler = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["axis_rotation_angle"])
+            self._sample_axis_rotation_angle = sampler(size=None, get_attribute=True, param=args)
+            self._lens_prior_names["axis_rotation_angle"] = prior
+        elif callable(prior):
             self._sample_axis_rotation_angle = prior
+            self._lens_prior_names["axis_rotation_angle"] = None
+        else:
+            raise ValueError(f"sample_axis_rotation_angle must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_shear(self):
@@ -1212,11 +1173,16 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_shear.setter
     def sample_shear(self, prior):
-        try:
+        if isinstance(prior, str):
             args = self.lens_param_samplers_params["shear"]
-            self._sample_shear = getattr(self, prior)(size=None, get_attribute=True, param=args)
-        except:
+            sampler = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["shear"])
+            self._sample_shear = sampler(size=None, get_attribute=True, param=args)
+            self._lens_prior_names["shear"] = prior
+        elif callable(prior):
             self._sample_shear = prior
+            self._lens_prior_names["shear"] = None
+        else:
+            raise ValueError(f"sample_shear must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_mass_density_spectral_index(self):
@@ -1244,11 +1210,16 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_mass_density_spectral_index.setter
     def sample_mass_density_spectral_index(self, prior):
-        try:
+        if isinstance(prior, str):
             args = self.lens_param_samplers_params["mass_density_spectral_index"]
-            self._sample_mass_density_spectral_index = getattr(self, prior)(size=None, get_attribute=True, param=args)
-        except:
+            sampler = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["mass_density_spectral_index"])
+            self._sample_mass_density_spectral_index = sampler(size=None, get_attribute=True, param=args)
+            self._lens_prior_names["mass_density_spectral_index"] = prior
+        elif callable(prior):
             self._sample_mass_density_spectral_index = prior
+            self._lens_prior_names["mass_density_spectral_index"] = None
+        else:
+            raise ValueError(f"sample_mass_density_spectral_index must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_source_parameters(self):
@@ -1269,10 +1240,12 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
 
     @sample_source_parameters.setter
     def sample_source_parameters(self, prior):
-        try:
-            self._sample_source_parameters = getattr(self, prior)
-        except:
+        if isinstance(prior, str):
+            self._sample_source_parameters = self._resolve_sampler(prior, self.available_lens_prior_list_and_its_params["source_parameters"])
+        elif callable(prior):
             self._sample_source_parameters = prior
+        else:
+            raise ValueError(f"sample_source_parameters must be the name of an available sampler or a callable, got {prior!r}")
 
 
     @property
@@ -1301,7 +1274,7 @@ class LensGalaxyParameterDistribution(CBCSourceParameterDistribution, ImagePrope
         """
 
         self._available_lens_functions = dict(
-            strong_lensing_condition=["rjs_with_cross_section_SIE", "rjs_with_cross_section_SIS"],
+            strong_lensing_condition=["rjs_with_cross_section_SIE", "rjs_with_cross_section_SIS", "resample_with_cross_section_SIE"],
             optical_depth=["SIS", "optical_depth_SIS_haris","optical_depth_SIS_hemanta", "SIE", "optical_depth_SIE_hemanta"],
             param_sampler_type=["sample_all_routine"],
         )
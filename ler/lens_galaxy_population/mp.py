@@ -4,7 +4,7 @@ from numba import njit
 from lenstronomy.LensModel.Solver.epl_shear_solver import caustics_epl_shear
 from shapely.geometry import Polygon
 
-from .jit_functions import phi_cut_SIE, axis_ratio_rayleigh, phi_q2_ellipticity_hemanta
+from .jit_functions import phi_cut_SIE, axis_ratio_rayleigh, phi_q2_ellipticity_hemanta, FOURPI_OVER_C2
 from ..utils import inverse_transform_sampler, cubic_spline_interpolator
 
 
@@ -38,7 +38,7 @@ def optical_depth_sis_mp(params):
         # einstein radius 
         Dls = (Da_zs*(1+zs) - Da(zl)*(1+zl))/(1+zs)
         theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / Da_zs
+            FOURPI_OVER_C2 * sigma * sigma * Dls / Da_zs
         )  # Note: km/s for sigma; Dls, Ds are in Mpc
 
         # cross section 
@@ -99,7 +99,7 @@ def optical_depth_sie1_mp(params):
         # einstein radius 
         Dls = (Da_zs*(1+zs) - Da(zl)*(1+zl))/(1+zs)
         theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / Da_zs
+            FOURPI_OVER_C2 * sigma * sigma * Dls / Da_zs
         )  # Note: km/s for sigma; Dls, Ds are in Mpc
 
         # cross section 
@@ -160,7 +160,7 @@ def optical_depth_sie2_mp(params):
         # einstein radius 
         Dls = (Da_zs*(1+zs) - Da(zl)*(1+zl))/(1+zs)
         theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / Da_zs
+            FOURPI_OVER_C2 * sigma * sigma * Dls / Da_zs
         )  # Note: km/s for sigma; Dls, Ds are in Mpc
 
         # cross section 
@@ -214,7 +214,7 @@ def optical_depth_sie3_mp(params):
         # einstein radius 
         Dls = (Da_zs*(1+zs) - Da(zl)*(1+zl))/(1+zs)
         theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / Da_zs
+            FOURPI_OVER_C2 * sigma * sigma * Dls / Da_zs
         )  # Note: km/s for sigma; Dls, Ds are in Mpc
 
         return theta_E, e1, e2, gamma1, gamma2, gamma
@@ -318,7 +318,7 @@ def optical_depth_sie4_mp(params):
         # einstein radius 
         Dls = (Da_zs*(1+zs) - Da(zl)*(1+zl))/(1+zs)
         theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / Da_zs
+            FOURPI_OVER_C2 * sigma * sigma * Dls / Da_zs
         )  # Note: km/s for sigma; Dls, Ds are in Mpc
 
         return theta_E, e1, e2, gamma1, gamma2, gamma
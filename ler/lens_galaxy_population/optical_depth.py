@@ -1,13 +1,13 @@
+import inspect
 from numba import njit
 from multiprocessing import Pool
 import numpy as np
 from scipy.integrate import quad
 from scipy.stats import gengamma
-from astropy.cosmology import LambdaCDM
 from tqdm import tqdm
 
-from ..utils import  interpolator_from_pickle, cubic_spline_interpolator, inverse_transform_sampler
-from .jit_functions import phi_cut_SIE, axis_ratio_rayleigh, axis_ratio_SIS, phi, phi_loc_bernardi
+from ..utils import  interpolator_from_pickle, cubic_spline_interpolator, inverse_transform_sampler, default_cosmology
+from .jit_functions import phi_cut_SIE, axis_ratio_rayleigh, axis_ratio_SIS, phi, phi_loc_bernardi, velocity_dispersion_z_dependent, einstein_radius_SIS, VD_QUANTILE_POWER, FOURPI_OVER_C2
 
 class OpticalDepth():
     """
@@ -171,7 +171,7 @@ class OpticalDepth():
         self.npool = npool
         self.z_min = z_min
         self.z_max = z_max
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         self.lens_type = lens_type
 
         self.sampler_priors = dict(
@@ -249,6 +249,12 @@ class OpticalDepth():
             name of velocity dispersion sampler
         """
 
+        # redshift dependent samplers take zl as the second argument, i.e. sample_velocity_dispersion(size, zl)
+        if callable(vd_name):
+            self.vd_is_z_dependent = "zl" in inspect.signature(vd_name).parameters
+        else:
+            self.vd_is_z_dependent = vd_name == "velocity_dispersion_ewoud"
+
         # generating inverse cdf interpolator for velocity dispersion
         vd_min=self.sampler_priors_params["velocity_dispersion"]["vd_min"]
         vd_max=self.sampler_priors_params["velocity_dispersion"]["vd_max"]
@@ -340,6 +346,21 @@ class OpticalDepth():
             create_new=create_new_,
         )
 
+        # the samplers only read the table, so it is shared without copying
+        if isinstance(self.vd_inv_cdf, np.ndarray):
+            self.vd_inv_cdf.setflags(write=False)
+
+        if vd_name == "velocity_dispersion_ewoud":
+            # inverse cdfs of all the redshift bins resampled on a common quantile grid
+            # the grid is dense near u=1, a uniform grid would interpolate linearly across the high velocity dispersion tail
+            u_grid = 1.0 - (1.0 - np.linspace(0, 1, resolution))**VD_QUANTILE_POWER
+            # float32 is well below the interpolation error of the table, and halves the memory read per sample
+            self.vd_quantile_table = np.array([np.interp(u_grid, cdf_, vd_) for cdf_, vd_ in self.vd_inv_cdf], dtype=np.float32)
+            self.vd_quantile_table.setflags(write=False)
+            # zl_list is built with np.linspace, so the redshift bin can be found without a binary search
+            dz = np.diff(self.zl_list)
+            self.zl_list_is_uniform = bool(np.allclose(dz, dz[0]))
+
         self.sample_velocity_dispersion = self.sampler_priors["velocity_dispersion"]
 
     def initialize_optical_depth_function(self, tau_name):
@@ -447,6 +468,34 @@ class OpticalDepth():
         self.strong_lensing_optical_depth = optical_depth_setter
         self.sample_axis_ratio = self.sampler_priors["axis_ratio"]
 
+    def axis_ratio_SIS(self, sigma, get_attribute=False, param=None, **kwargs):
+        """
+        Function to sample axis ratio of the SIS lens galaxy, i.e. q=1.
+
+        Parameters
+        ----------
+        sigma : `float: array`
+            velocity dispersion of the lens galaxy
+        get_attribute : `bool`
+            if True, returns a function that can be used to sample axis ratio
+
+        Returns
+        -------
+        q : `float: array`
+            axis ratio of the lens galaxy
+
+        Examples
+        --------
+        >>> from ler.lens_galaxy_population import OpticalDepth
+        >>> od = OpticalDepth(sampler_priors=dict(axis_ratio="axis_ratio_SIS"))
+        >>> print(od.sample_axis_ratio(sigma=np.array([200.])))
+        """
+
+        if get_attribute:
+            return axis_ratio_SIS
+        else:
+            return axis_ratio_SIS(sigma)
+
     def axis_ratio_rayleigh(self, sigma, q_min=0.2, q_max=1.0, get_attribute=False, param=None, **kwargs):
         """
         Function to sample axis ratio from rayleigh distribution with given velocity dispersion.
@@ -590,7 +639,7 @@ class OpticalDepth():
 
         """
 
-        vd_inv_cdf = self.vd_inv_cdf.copy()
+        vd_inv_cdf = self.vd_inv_cdf
         # get the interpolator (inverse cdf) and sample
         if get_attribute:
             return njit(lambda size: inverse_transform_sampler(size, vd_inv_cdf[0], vd_inv_cdf[1]))
@@ -620,7 +669,7 @@ class OpticalDepth():
         >>> print(od.sample_velocity_dispersion(size=10))
         """
 
-        vd_inv_cdf = self.vd_inv_cdf.copy()
+        vd_inv_cdf = self.vd_inv_cdf
         # get the interpolator (inverse cdf) and sample
         if get_attribute:
             return njit(lambda size: inverse_transform_sampler(size, vd_inv_cdf[0], vd_inv_cdf[1]))
@@ -652,21 +701,14 @@ class OpticalDepth():
         >>> print(od.sample_velocity_dispersion(size=10, zl=0.5))
         """
 
-        z_max = self.z_max
-        z_min = self.z_min
-        zlist = np.linspace(z_min, z_max, 100)
-        vd_inv_cdf = self.vd_inv_cdf.copy()
+        zl_list = self.zl_list
+        vd_quantile_table = self.vd_quantile_table
+        uniform_grid = self.zl_list_is_uniform
 
-        @njit
-        def sampler(size, zl, inv_cdf, zlist):
-            
-            idx = np.searchsorted(zlist, zl)
-            return inverse_transform_sampler(size, inv_cdf[idx][0], inv_cdf[idx][1])
-        
         if get_attribute:
-            return njit(lambda size, zl: sampler(size, zl, vd_inv_cdf, zlist))
+            return njit(lambda size, zl: velocity_dispersion_z_dependent(size, zl*np.ones(size), zl_list, vd_quantile_table, uniform_grid))
         else:
-            return sampler(size, zl, vd_inv_cdf, zlist)
+            return velocity_dispersion_z_dependent(size, zl*np.ones(size), zl_list, vd_quantile_table, uniform_grid)
 
     def cross_section_SIS(self, sigma, zl, zs):
         """
@@ -694,11 +736,13 @@ class OpticalDepth():
         """
         zl = np.array([zl]).reshape(-1)
         zs = np.array([zs]).reshape(-1)
-        Ds = self.angular_diameter_distance(zs)
-        Dls = self.angular_diameter_distance_z1z2(zl, zs)
-        theta_E = (
-            4.0 * np.pi * (sigma / 299792.458) ** 2 * Dls / (Ds)
-        )  # Note: km/s for sigma; Dls, Ds are in Mpc
+        if self.cosmo.Ok0 == 0:
+            theta_E = einstein_radius_SIS(sigma, zl, zs, self.splineDc)  # Note: km/s for sigma
+        else:
+            # non-flat universe
+            Dls = self.angular_diameter_distance_z1z2(zl, zs)
+            Ds = self.angular_diameter_distance(zs)
+            theta_E = FOURPI_OVER_C2 * sigma * sigma * Dls / Ds
 
         return np.pi * theta_E**2
     
@@ -727,10 +771,10 @@ class OpticalDepth():
         zl = np.array([zl]).reshape(-1)
         zs = np.array([zs]).reshape(-1)
         # size=5000 will take ~ 48s to run, with ewoud vd sampler
-        try:
-            sigma = self.sample_velocity_dispersion(size=5000)
-        except:
+        if self.vd_is_z_dependent:
             sigma = self.sample_velocity_dispersion(size=5000, zl=zl)
+        else:
+            sigma = self.sample_velocity_dispersion(size=5000)
 
         q = self.sample_axis_ratio(sigma)  # if SIS, q=array of 1.0
         no = self.sampler_priors_params["velocity_dispersion"]["phistar"]
@@ -909,7 +953,14 @@ class OpticalDepth():
         self.angular_diameter_distance = angular_diameter_distance
 
         # for angular diameter distance between two redshifts
-        self.angular_diameter_distance_z1z2 = njit(lambda zl0, zs0: (angular_diameter_distance(zs0)*(1.+zs0) - angular_diameter_distance(zl0)*(1.+zl0))/(1.+zs0))
+        if self.cosmo.Ok0 == 0:
+            # flat universe, from the comoving distance table
+            z_to_Dc = self.z_to_Dc
+            self.angular_diameter_distance_z1z2 = njit(lambda zl0, zs0: (z_to_Dc(zs0) - z_to_Dc(zl0))/(1.+zs0))
+        else:
+            # non-flat universe, Dc differences do not hold; use astropy
+            cosmo = self.cosmo
+            self.angular_diameter_distance_z1z2 = lambda zl0, zs0: cosmo.angular_diameter_distance_z1z2(zl0, zs0).value
 
         # get differential co-moving volume interpolator
         resolution = self.c_n_i["differential_comoving_volume"]["resolution"]
@@ -964,6 +1015,27 @@ class OpticalDepth():
             except:
                 raise ValueError("strong_lensing_optical_depth must be a callable function or spline interpolator array.")
 
+    def _resolve_sampler(self, prior, available):
+        """
+        Function to get the sampler method of the class from its name.
+
+        Parameters
+        ----------
+        prior : `str`
+            name of the sampler
+        available : `dict`
+            available samplers of the parameter, with the sampler names as keys
+
+        Returns
+        -------
+        sampler : `function`
+            sampler method of the class
+        """
+
+        if prior not in available:
+            raise KeyError(f"{prior!r} is not an available sampler. Available samplers: {list(available)}")
+        return getattr(self, prior)
+
     @property
     def sample_velocity_dispersion(self):
         """
@@ -992,10 +1064,13 @@ class OpticalDepth():
 
     @sample_velocity_dispersion.setter
     def sample_velocity_dispersion(self, prior):
-        try:
-            self._sample_velocity_dispersion = getattr(self, prior)(size=None, zl=None, get_attribute=True)
-        except:
+        if isinstance(prior, str):
+            sampler = self._resolve_sampler(prior, self.available_velocity_dispersion_list_and_its_params)
+            self._sample_velocity_dispersion = sampler(size=None, zl=None, get_attribute=True)
+        elif callable(prior):
             self._sample_velocity_dispersion = prior
+        else:
+            raise ValueError(f"sample_velocity_dispersion must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def sample_axis_ratio(self):
@@ -1023,11 +1098,14 @@ class OpticalDepth():
 
     @sample_axis_ratio.setter
     def sample_axis_ratio(self, prior):
-        try:
+        if isinstance(prior, str):
             args = self.sampler_priors_params["axis_ratio"]
-            self._sample_axis_ratio = getattr(self, prior)(sigma=None, get_attribute=True, param=args)
-        except:
+            sampler = self._resolve_sampler(prior, self.available_axis_ratio_list_and_its_params)
+            self._sample_axis_ratio = sampler(sigma=None, get_attribute=True, param=args)
+        elif callable(prior):
             self._sample_axis_ratio = prior
+        else:
+            raise ValueError(f"sample_axis_ratio must be the name of an available sampler or a callable, got {prior!r}")
 
     @property
     def available_velocity_dispersion_list_and_its_params(self):
@@ -8,10 +8,9 @@ import warnings
 warnings.filterwarnings("ignore")
 import contextlib
 import numpy as np
-from scipy.stats import norm
-from astropy.cosmology import LambdaCDM
+from scipy.special import erfc
 from ..gw_source_population import CBCSourceParameterDistribution
-from ..utils import load_json, append_json, get_param_from_json, batch_handler
+from ..utils import load_json, append_json, save_json_if_changed, get_param_from_json, batch_handler, default_cosmology, preallocate_dictionary, select_detectable_params, collect_detectable_params
 
 
 class GWRATES(CBCSourceParameterDistribution):
@@ -291,7 +290,7 @@ class GWRATES(CBCSourceParameterDistribution):
         self.z_min = z_min
         self.z_max = z_max
         self.event_type = event_type
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         self.size = size
         self.batch_size = batch_size
         self.json_file_names = dict(gwrates_params="gwrates_params.json", gw_param="gw_param.json", gw_param_detectable="gw_param_detectable.json",)
@@ -299,6 +298,8 @@ class GWRATES(CBCSourceParameterDistribution):
             self.json_file_names.update(json_file_names)
         self.interpolator_directory = interpolator_directory
         self.ler_directory = ler_directory
+        # last parameters written to each params json file, see store_gwrates_params
+        self._stored_params = {}
         # create directory if not exists
         if not os.path.exists(ler_directory):
             os.makedirs(ler_directory)
@@ -643,15 +644,15 @@ class GWRATES(CBCSourceParameterDistribution):
         # snr calculator params
         try:
             snr_calculator_dict = self.snr_calculator_dict.copy()
-            for key, value in snr_calculator_dict.items():
-                snr_calculator_dict[key] = str(value)
-            parameters_dict.update({"snr_calculator_dict": snr_calculator_dict})
-
-            file_name = output_jsonfile
-            append_json(self.ler_directory+"/"+file_name, parameters_dict, replace=True)
-        except:
+        except AttributeError:
             # if snr_calculator is custom function
-            pass
+            return
+        for key, value in snr_calculator_dict.items():
+            snr_calculator_dict[key] = str(value)
+        parameters_dict.update({"snr_calculator_dict": snr_calculator_dict})
+
+        # the parameters only change if the setup changes; skip rewriting an unchanged file
+        save_json_if_changed(self.ler_directory+"/"+output_jsonfile, parameters_dict, self._stored_params)
 
     def gw_cbc_statistics(
         self, size=None, resume=False, save_batch=False, output_jsonfile=None,
@@ -691,36 +692,17 @@ class GWRATES(CBCSourceParameterDistribution):
         output_path = os.path.join(self.ler_directory, output_jsonfile)
         print(f"Simulated GW params will be stored in {output_path}")
 
-        # sampling in batches
-        if resume and os.path.exists(output_path):
-            # get sample from json file
-            self.dict_buffer = get_param_from_json(output_path)
-        else:
-            self.dict_buffer = None
-
-        batch_handler(
+        # batch_handler collects the batches (in a preallocated buffer, or in the json file if save_batch=True) and stores them
+        gw_param = batch_handler(
             size=size,
             batch_size=self.batch_size,
             sampling_routine=self.gw_sampling_routine,
             output_jsonfile=output_path,
             save_batch=save_batch,
             resume=resume,
+            param_name="gw parameters",
         )
 
-        if save_batch:
-            gw_param = get_param_from_json(output_path)
-        else:
-            # this if condition is required if there is nothing to save
-            if self.dict_buffer:
-                gw_param = self.dict_buffer.copy()
-                # store all params in json file
-                print(f"saving all gw_params in {output_path}...")
-                append_json(output_path, gw_param, replace=True)
-            else:
-                print("gw_params already sampled.")
-                gw_param = get_param_from_json(output_path)
-        self.dict_buffer = None  # save memory
-
         return gw_param
     
     def gw_sampling_routine(self, size, output_jsonfile, resume=False, save_batch=True):
@@ -760,17 +742,6 @@ class GWRATES(CBCSourceParameterDistribution):
             pdet = self.pdet(gw_param_dict=gw_param)
             gw_param.update(pdet)
 
-        # adding batches
-        if not save_batch:
-            if self.dict_buffer is None:
-                self.dict_buffer = gw_param
-            else:
-                for key, value in gw_param.items():
-                    self.dict_buffer[key] = np.concatenate((self.dict_buffer[key], value))
-        else:
-            # store all params in json file
-            self.dict_buffer = append_json(file_name=output_jsonfile, new_dictionary=gw_param,  old_dictionary=self.dict_buffer, replace=not (resume))
-
         return gw_param
 
     def gw_rate(
@@ -841,7 +812,7 @@ class GWRATES(CBCSourceParameterDistribution):
         # find index of detectable events
         idx_detectable = self._find_detectable_index(gw_param, snr_threshold, pdet_threshold, detectability_condition)
 
-        detectable_events = np.sum(idx_detectable)
+        detectable_events = np.count_nonzero(idx_detectable)
         # montecarlo integration
         # The total rate R = norm <Theta(rho-rhoc)>
         total_rate = self.rate_function(detectable_events, total_events)
@@ -898,7 +869,7 @@ class GWRATES(CBCSourceParameterDistribution):
         """
 
         snr_param = gw_param["optimal_snr_net"]
-        idx_detectable = (snr_param > snr_threshold_recalculation[0]) & (snr_param < snr_threshold_recalculation[1])
+        idx_detectable = np.flatnonzero((snr_param > snr_threshold_recalculation[0]) & (snr_param < snr_threshold_recalculation[1]))
         # reduce the size of the dict
         for key, value in gw_param.items():
             gw_param[key] = value[idx_detectable]
@@ -939,7 +910,7 @@ class GWRATES(CBCSourceParameterDistribution):
                 threshold = snr_threshold
             elif detectability_condition == "pdet":
                 print("given detectability_condition == 'pdet'")
-                param = 1 - norm.cdf(snr_threshold - gw_param["optimal_snr_net"])
+                param = 0.5 * erfc((snr_threshold - gw_param["optimal_snr_net"]) / np.sqrt(2.0))  # 1 - norm.cdf(snr_threshold - snr)
                 gw_param["pdet_net"] = param
                 threshold = pdet_threshold
         elif self.pdet:
@@ -1020,13 +991,7 @@ class GWRATES(CBCSourceParameterDistribution):
             if True, it will replace the json file. If False, it will append the json file.
         """
 
-        # store all detectable params in json file
-        if nan_to_num:
-            for key, value in param.items():
-                param[key] = np.nan_to_num(value[idx_detectable])
-        else:
-            for key, value in param.items():
-                param[key] = value[idx_detectable]
+        param = select_detectable_params(param, idx_detectable, nan_to_num=nan_to_num)
 
         # store all detectable params in json file
         if output_jsonfile is None:
@@ -1124,13 +1089,14 @@ class GWRATES(CBCSourceParameterDistribution):
         """
 
         # initial setup
-        n, events_total, output_path, meta_data_path, buffer_file = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        n, events_total, output_path, meta_data_path, buffer_file, param_final = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        # the detectable events are collected in arrays preallocated for size events, instead of being concatenated batch by batch
+        param_buffer = {} if param_final is None else preallocate_dictionary(param_final, size)[0]
 
         # loop until n samples are collected
         while n < size:
             # disable print statements
             with contextlib.redirect_stdout(None):
-                self.dict_buffer = None  # this is used to store the sampled gw_param in batches when running the sampling_routine
                 gw_param = self.gw_sampling_routine(
                     size=batch_size, output_jsonfile=buffer_file, save_batch=False,resume=False
                 )
@@ -1144,23 +1110,25 @@ class GWRATES(CBCSourceParameterDistribution):
             # find index of detectable events
             idx_detectable = self._find_detectable_index(gw_param, snr_threshold, pdet_threshold, detectability_condition)
 
-            # store all params in json file
-            self._save_detectable_params(output_jsonfile, gw_param, idx_detectable, key_file_name="n_gw_detectable_events", nan_to_num=False, verbose=False, replace_jsonfile=False)
+            # the number of detectable events is counted from the selected indices, the mask is not scanned again
+            n = collect_detectable_params(param_buffer, gw_param, idx_detectable, n, size, nan_to_num=False)
 
-            n += np.sum(idx_detectable)
             events_total += total_events_in_this_iteration              
             total_rate = self.rate_function(n, events_total, verbose=False)
 
             # bookmark
             self._append_meta_data(meta_data_path, n, events_total, total_rate)
 
-        print(f"stored detectable gw params in {output_path}")
-        print(f"stored meta data in {meta_data_path}")
-
+        # the json file is written once, after all the events are collected
+        param_final = {key: value[:n] for key, value in param_buffer.items()}
+        self.json_file_names["n_gw_detectable_events"] = output_jsonfile
         if trim_to_size:
-            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path)
+            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path, param_final=param_final)
         else:
-            param_final = get_param_from_json(output_path)
+            append_json(output_path, param_final, replace=True)
+
+        print(f"stored detectable gw params in {output_path}")
+        print(f"stored meta data in {meta_data_path}")
 
         # call self.json_file_names["ler_param"] and for adding the final results
         data = load_json(self.ler_directory+"/"+self.json_file_names["gwrates_params"])
@@ -1206,6 +1174,8 @@ class GWRATES(CBCSourceParameterDistribution):
             path to the metadata json file.
         buffer_file : `str`
             path to the buffer json file.
+        param_final : `dict`
+            dictionary of the detectable events already collected, if resumed. Otherwise None.
         """
 
         meta_data_path = self.ler_directory+"/"+meta_data_file
@@ -1218,6 +1188,7 @@ class GWRATES(CBCSourceParameterDistribution):
         else:
             self.batch_size = batch_size
 
+        param_final = None
         if not resume:
             n = 0  # iterator
             events_total = 0
@@ -1230,8 +1201,11 @@ class GWRATES(CBCSourceParameterDistribution):
             if os.path.exists(output_path):
                 param_final = get_param_from_json(output_path)
                 n = len(param_final["zs"])
-                events_total = load_json(meta_data_path)["events_total"][-1]
-                del param_final
+                # the output file is only written at the end of a run, so the meta data of an interrupted run can go beyond it
+                # the last bookmark with n detectable events is the one that matches the output file
+                meta_data = load_json(meta_data_path)
+                idx = np.flatnonzero(np.array(meta_data["detectable_events"]) == n)
+                events_total = meta_data["events_total"][idx[-1] if len(idx) > 0 else -1]
             else:
                 n = 0
                 events_total = 0
@@ -1239,9 +1213,9 @@ class GWRATES(CBCSourceParameterDistribution):
         buffer_file = "params_buffer.json"
         print("collected number of detectable events = ", n)
 
-        return n, events_total, output_path, meta_data_path, buffer_file
+        return n, events_total, output_path, meta_data_path, buffer_file, param_final
 
-    def _trim_results_to_size(self, size, output_path, meta_data_path):
+    def _trim_results_to_size(self, size, output_path, meta_data_path, param_final=None):
         """
         Helper function of 'selecting_n_gw_detectable_events' and 'selecting_n_lensed_detectable_events' functions. Trims the data in the output file to the specified size and updates the metadata accordingly.
 
@@ -1253,6 +1227,9 @@ class GWRATES(CBCSourceParameterDistribution):
             path to the output json file.
         meta_data_path : `str`
             path to the metadata json file.
+        param_final : `dict`
+            dictionary of the detectable events stored in the output file. If None, it is read from the output file.
+            default param_final = None.
 
         Returns
         ----------
@@ -1263,7 +1240,8 @@ class GWRATES(CBCSourceParameterDistribution):
         """
 
         print(f"\n trmming final result to size={size}")
-        param_final = get_param_from_json(output_path)
+        if param_final is None:
+            param_final = get_param_from_json(output_path)
         # randomly select size number of samples
         len_ = len(list(param_final.values())[0])
         idx = np.random.choice(len_, size, replace=False)
@@ -10,10 +10,9 @@ import logging
 logging.getLogger('numexpr.utils').setLevel(logging.ERROR)
 import contextlib
 import numpy as np
-from scipy.stats import norm
-from astropy.cosmology import LambdaCDM
+from scipy.special import erfc
 from ..lens_galaxy_population import LensGalaxyParameterDistribution
-from ..utils import load_json, append_json, get_param_from_json, batch_handler
+from ..utils import load_json, append_json, save_json_if_changed, get_param_from_json, batch_handler, default_cosmology, preallocate_dictionary, select_detectable_params, collect_detectable_params, lensed_snr_threshold_check, largest_k
 
 
 # # multiprocessing guard code
@@ -464,7 +463,7 @@ class LeR(LensGalaxyParameterDistribution):
         self.z_min = z_min
         self.z_max = z_max
         self.event_type = event_type
-        self.cosmo = cosmology if cosmology else LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+        self.cosmo = cosmology if cosmology else default_cosmology()
         self.size = size
         self.batch_size = batch_size
         self.json_file_names = dict(ler_params="ler_params.json", unlensed_param="unlensed_param.json", unlensed_param_detectable="unlensed_param_detectable.json", lensed_param="lensed_param.json", lensed_param_detectable="lensed_param_detectable.json")
@@ -473,6 +472,8 @@ class LeR(LensGalaxyParameterDistribution):
         self.interpolator_directory = interpolator_directory
         kwargs["create_new_interpolator"] = create_new_interpolator
         self.ler_directory = ler_directory
+        # last parameters written to each params json file, see store_ler_params
+        self._stored_params = {}
         # create directory if not exists
         if not os.path.exists(ler_directory):
             os.makedirs(ler_directory)
@@ -760,6 +761,7 @@ class LeR(LensGalaxyParameterDistribution):
             spin_precession=False,
             directory=self.interpolator_directory,
             create_new_interpolator=False,
+            seed=None,
         )
         if params:
             for key, value in params.items():
@@ -788,6 +790,7 @@ class LeR(LensGalaxyParameterDistribution):
             spin_precession=input_params["spin_precession"],
             directory=input_params["directory"],
             create_new_interpolator=input_params["create_new_interpolator"],
+            seed=input_params["seed"],
         )
 
         self.gw_param_sampler_dict["source_priors"]=self.gw_param_samplers.copy()
@@ -919,15 +922,15 @@ class LeR(LensGalaxyParameterDistribution):
         # snr calculator params
         try:
             snr_calculator_dict = self.snr_calculator_dict.copy()
-            for key, value in snr_calculator_dict.items():
-                snr_calculator_dict[key] = str(value)
-            parameters_dict.update({"snr_calculator_dict": snr_calculator_dict})
-
-            file_name = output_jsonfile
-            append_json(self.ler_directory+"/"+file_name, parameters_dict, replace=True)
-        except:
+        except AttributeError:
             # if snr_calculator is custom function
-            pass
+            return
+        for key, value in snr_calculator_dict.items():
+            snr_calculator_dict[key] = str(value)
+        parameters_dict.update({"snr_calculator_dict": snr_calculator_dict})
+
+        # the parameters only change if the setup changes; skip rewriting an unchanged file
+        save_json_if_changed(self.ler_directory+"/"+output_jsonfile, parameters_dict, self._stored_params)
 
     def unlensed_cbc_statistics(
         self, size=None, resume=False, save_batch=False, output_jsonfile=None,
@@ -1086,7 +1089,7 @@ class LeR(LensGalaxyParameterDistribution):
         # find index of detectable events
         idx_detectable = self._find_detectable_index_unlensed(unlensed_param, snr_threshold, pdet_threshold, detectability_condition)
 
-        detectable_events = np.sum(idx_detectable)
+        detectable_events = np.count_nonzero(idx_detectable)
         # montecarlo integration
         # The total rate R = norm <Theta(rho-rhoc)>
         total_rate = self.rate_function(detectable_events, total_events, param_type="unlensed")
@@ -1126,6 +1129,7 @@ class LeR(LensGalaxyParameterDistribution):
             return get_param_from_json(path_)
         else:
             print("Using provided {param_type} dict...")
+            # shallow copy, the arrays are not copied. The detectable events are selected later, and the selected arrays replace the values of this dict, so the provided dict is left unchanged
             return param.copy()
 
     def _recalculate_snr_unlensed(self, unlensed_param, snr_threshold_recalculation):
@@ -1147,7 +1151,7 @@ class LeR(LensGalaxyParameterDistribution):
         """
 
         snr_param = unlensed_param["optimal_snr_net"]
-        idx_detectable = (snr_param > snr_threshold_recalculation[0]) & (snr_param < snr_threshold_recalculation[1])
+        idx_detectable = np.flatnonzero((snr_param > snr_threshold_recalculation[0]) & (snr_param < snr_threshold_recalculation[1]))
         # reduce the size of the dict
         for key, value in unlensed_param.items():
             unlensed_param[key] = value[idx_detectable]
@@ -1188,7 +1192,7 @@ class LeR(LensGalaxyParameterDistribution):
                 threshold = snr_threshold
             elif detectability_condition == "pdet":
                 print("given detectability_condition == 'pdet'")
-                param = 1 - norm.cdf(snr_threshold - unlensed_param["optimal_snr_net"])
+                param = 0.5 * erfc((snr_threshold - unlensed_param["optimal_snr_net"]) / np.sqrt(2.0))  # 1 - norm.cdf(snr_threshold - snr)
                 unlensed_param["pdet_net"] = param
                 threshold = pdet_threshold
         elif self.pdet:
@@ -1272,13 +1276,7 @@ class LeR(LensGalaxyParameterDistribution):
             if True, it will replace the json file. If False, it will append the json file.
         """
 
-        # store all detectable params in json file
-        if nan_to_num:
-            for key, value in param.items():
-                param[key] = np.nan_to_num(value[idx_detectable])
-        else:
-            for key, value in param.items():
-                param[key] = value[idx_detectable]
+        param = select_detectable_params(param, idx_detectable, nan_to_num=nan_to_num)
 
         # store all detectable params in json file
         if output_jsonfile is None:
@@ -1408,12 +1406,13 @@ class LeR(LensGalaxyParameterDistribution):
 
             # check for invalid samples
             idx = lensed_param["n_images"] < 2
+            n_invalid = np.count_nonzero(idx)
             
-            if np.sum(idx) == 0:
+            if n_invalid == 0:
                 break
             else:
-                print(f"Invalid sample found. Resampling {np.sum(idx)} lensed events...")
-                size = np.sum(idx)
+                print(f"Invalid sample found. Resampling {n_invalid} lensed events...")
+                size = n_invalid
                 
         # Get all of the signal to noise ratios
         if self.snr:
@@ -1523,7 +1522,7 @@ class LeR(LensGalaxyParameterDistribution):
         snr_hit = self._find_detectable_index_lensed(lensed_param, snr_threshold, pdet_threshold, num_img, detectability_condition, combine_image_snr=combine_image_snr, snr_cut_for_combine_image_snr=snr_cut_for_combine_image_snr)
 
         # montecarlo integration
-        total_rate = self.rate_function(np.sum(snr_hit), total_events, param_type="lensed")
+        total_rate = self.rate_function(np.count_nonzero(snr_hit), total_events, param_type="lensed")
 
         # store all detectable params in json file
         self._save_detectable_params(output_jsonfile, lensed_param, snr_hit, key_file_name="lensed_param_detectable", nan_to_num=nan_to_num, verbose=True, replace_jsonfile=True)
@@ -1593,20 +1592,20 @@ class LeR(LensGalaxyParameterDistribution):
         if "optimal_snr_net" not in lensed_param:
             raise ValueError("optimal_snr_net not provided in lensed_param dict. Exiting...")
 
-        snr_param = lensed_param["optimal_snr_net"]
-        snr_param = -np.sort(-snr_param, axis=1)  # sort snr in descending order
-            
-        # for each row: choose a threshold and check if the number of images above threshold. Sum over the images. If sum is greater than num_img, then snr_hit = True
-        j = 0
-        idx_max = 0
-        snr_hit = np.full(total_events, True)  # boolean array to store the result of the threshold condition
-        for i, snr_th_min in enumerate(snr_threshold_recalculation_min):
-            snr_th_max = snr_threshold_recalculation_max[i]
-            idx_max = idx_max + num_img_recalculation[i]
-            snr_hit = snr_hit & (np.sum((snr_param[:,j:idx_max] > snr_th_min) & (snr_param[:,j:idx_max] < snr_th_max), axis=1) >= num_img_recalculation[i])
-            j = idx_max
+        # for each row: the images (columns) assigned to each threshold should have snr between the lower and upper thresholds
+        # the thresholds are repeated for their number of images, and all the columns are compared at once
+        num_img_total = np.sum(num_img_recalculation)
+        snr_th_min = np.repeat(snr_threshold_recalculation_min, num_img_recalculation)
+        snr_th_max = np.repeat(snr_threshold_recalculation_max, num_img_recalculation)
+        # snr of the brightest num_img_total images, sorted in descending order
+        snr_param = largest_k(lensed_param["optimal_snr_net"], num_img_total)
+        if snr_param.shape[1] < num_img_total:
+            snr_hit = np.full(total_events, False)  # not enough images
+        else:
+            snr_hit = np.all((snr_param > snr_th_min) & (snr_param < snr_th_max), axis=1)
 
         # reduce the size of the dict
+        snr_hit = np.flatnonzero(snr_hit)
         for key, value in lensed_param.items():
             lensed_param[key] = value[snr_hit]
         # recalculate more accurate snrs
@@ -1653,8 +1652,6 @@ class LeR(LensGalaxyParameterDistribution):
             if "optimal_snr_net" not in lensed_param:
                 raise ValueError("'optimal_snr_net' not in lensed parm dict provided")
             snr_param = lensed_param["optimal_snr_net"]
-            snr_param = -np.sort(-snr_param, axis=1)  # sort snr in descending order
-            snr_hit = np.full(len(snr_param), True)  # boolean array to store the result of the threshold condition
 
             if not combine_image_snr:
                 # for each row: choose a threshold and check if the number of images above threshold. Sum over the images. If sum is greater than num_img, then snr_hit = True 
@@ -1663,16 +1660,16 @@ class LeR(LensGalaxyParameterDistribution):
                 # ii) for loop runs wrt snr_threshold. idx_max = idx_max + num_img[i]
                 # iii) First iteration: snr_threshold=8 and num_img=2. In snr_param, column index 0 and 1 (i.e. 0:num_img[0]) are considered. The sum of snr_param[0, 0:2] > 8 is checked. If True, then snr_hit = True. 
                 # v) Second iteration: snr_threshold=6 and num_img=1. In snr_param, column index 2 (i.e. num_img[0]:num_img[1]) is considered. The sum of snr_param[0, 0:1] > 6 is checked. If True, then snr_hit = True.
-                j = 0
-                idx_max = 0
-                for i, snr_th in enumerate(snr_threshold):
-                    idx_max = idx_max + num_img[i]
-                    snr_hit = snr_hit & (np.sum((snr_param[:,j:idx_max] > snr_th), axis=1) >= num_img[i])
-                    j = idx_max
+                # the iterations are done at once, by repeating each threshold num_img times, i.e. [8,8,6], and comparing all the columns, i.e. all(snr_param[0, 0:3] > [8,8,6])
+                # the sorting and the comparison are done row by row in a single numba pass
+                snr_th = np.repeat(snr_threshold, num_img).astype(np.float64)
+                snr_hit, _ = lensed_snr_threshold_check(snr_param, snr_th)
             else:
+                # snr of the brightest np.sum(num_img) images, their order does not matter for the sum
+                snr_param = largest_k(snr_param, np.sum(num_img), sort=False)
                 # sqrt of the the sum of the squares of the snr of the images
                 snr_param[snr_param<snr_cut_for_combine_image_snr] = 0.0 # images with snr below snr_cut_for_combine_image_snr are not considered 
-                snr_param = np.sqrt(np.sum(snr_param[:,:np.sum(num_img)]**2, axis=1))
+                snr_param = np.sqrt(np.sum(snr_param**2, axis=1))
                 snr_hit = snr_param >= snr_threshold[0]
                 
         elif detectability_condition == "pdet":
@@ -1681,26 +1678,20 @@ class LeR(LensGalaxyParameterDistribution):
                     raise ValueError("'optimal_snr_net' or 'pdet_net' not in lensed parm dict provided")
                 else:
                     print("calculating pdet using 'optimal_snr_net'...")
-                    # pdet dimension is (size, n_max_images)
                     snr_param = lensed_param["optimal_snr_net"]
-                    snr_param = -np.sort(-snr_param, axis=1)  # sort snr in descending order
-
-                    # column index beyong np.sum(num_img)-1 are not considered
-                    pdet = np.ones((len(snr_param), np.sum(num_img)))
-                    j = 0
-                    idx_max = 0
-                    for i, snr_th in enumerate(snr_threshold):
-                        idx_max = idx_max + num_img[i]
-                        pdet[:,j:idx_max] = 1 - norm.cdf(snr_th - snr_param[:,j:idx_max])
-                        j = idx_max
+
+                    # images are sorted by snr in descending order, and column index beyong np.sum(num_img)-1 are not considered
+                    # each threshold is repeated for its number of images, e.g. snr_threshold=[8,6] and num_img=[2,1] gives [8,8,6]
+                    # pdet = 1 - norm.cdf(snr_th - snr) of the images is multiplied row by row in a single numba pass
+                    snr_th = np.repeat(snr_threshold, num_img).astype(np.float64)
+                    _, pdet_combined = lensed_snr_threshold_check(snr_param, snr_th, compute_pdet=True)
             else:
-                pdet = lensed_param["pdet_net"]
-                # sort pdet in descending order
-                pdet = -np.sort(-pdet, axis=1)  
-                # column index beyong np.sum(num_img)-1 are not considered
-                pdet = pdet[:,:np.sum(num_img)] 
+                # largest np.sum(num_img) pdet of each event, column index beyong np.sum(num_img)-1 of the sorted pdet are not considered
+                # their order does not matter for the product
+                pdet = largest_k(lensed_param["pdet_net"], np.sum(num_img), sort=False)
+                pdet_combined = np.prod(pdet, axis=1)
                 
-            snr_hit = np.prod(pdet, axis=1)>=pdet_threshold
+            snr_hit = pdet_combined>=pdet_threshold
 
         return snr_hit
 
@@ -1904,15 +1895,17 @@ class LeR(LensGalaxyParameterDistribution):
         """
 
         # initial setup
-        n, events_total, output_path, meta_data_path, buffer_file, batch_size = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        n, events_total, output_path, meta_data_path, buffer_file, batch_size, param_final = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        # the detectable events are collected in arrays preallocated for size events, instead of being concatenated batch by batch
+        param_buffer = {} if param_final is None else preallocate_dictionary(param_final, size)[0]
 
         # loop until n samples are collected
+        sampling_size = self._next_sampling_size(size, n, events_total, batch_size)
         while n < size:
             # disable print statements
             with contextlib.redirect_stdout(None):
-                self.dict_buffer = None  # this is used to store the sampled unlensed_param in batches when running the sampling_routine
                 unlensed_param = self.unlensed_sampling_routine(
-                    size=batch_size, output_jsonfile=buffer_file, save_batch=False,resume=False
+                    size=sampling_size, output_jsonfile=buffer_file, save_batch=False,resume=False
                 )
 
             total_events_in_this_iteration = len(unlensed_param["zs"])
@@ -1924,23 +1917,26 @@ class LeR(LensGalaxyParameterDistribution):
             # find index of detectable events
             idx_detectable = self._find_detectable_index_unlensed(unlensed_param, snr_threshold, pdet_threshold, detectability_condition)
 
-            # store all params in json file
-            self._save_detectable_params(output_jsonfile, unlensed_param, idx_detectable, key_file_name="n_unlensed_detectable_events", nan_to_num=False, verbose=False, replace_jsonfile=False)
+            # the number of detectable events is counted from the selected indices, the mask is not scanned again
+            n = collect_detectable_params(param_buffer, unlensed_param, idx_detectable, n, size, nan_to_num=False)
 
-            n += np.sum(idx_detectable)
             events_total += total_events_in_this_iteration              
             total_rate = self.rate_function(n, events_total, param_type="unlensed", verbose=False)
+            sampling_size = self._next_sampling_size(size, n, events_total, batch_size)
 
             # bookmark
             self._append_meta_data(meta_data_path, n, events_total, total_rate)
 
-        print(f"stored detectable unlensed params in {output_path}")
-        print(f"stored meta data in {meta_data_path}")
-
+        # the json file is written once, after all the events are collected
+        param_final = {key: value[:n] for key, value in param_buffer.items()}
+        self.json_file_names["n_unlensed_detectable_events"] = output_jsonfile
         if trim_to_size:
-            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path)
+            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path, param_final=param_final)
         else:
-            param_final = get_param_from_json(output_path)
+            append_json(output_path, param_final, replace=True)
+
+        print(f"stored detectable unlensed params in {output_path}")
+        print(f"stored meta data in {meta_data_path}")
 
         # call self.json_file_names["ler_param"] and for adding the final results
         data = load_json(self.ler_directory+"/"+self.json_file_names["ler_params"])
@@ -2034,17 +2030,19 @@ class LeR(LensGalaxyParameterDistribution):
         """
 
         # initial setup
-        n, events_total, output_path, meta_data_path, buffer_file, batch_size = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        n, events_total, output_path, meta_data_path, buffer_file, batch_size, param_final = self._initial_setup_for_n_event_selection(meta_data_file, output_jsonfile, resume, batch_size)
+        # the detectable events are collected in arrays preallocated for size events, instead of being concatenated batch by batch
+        param_buffer = {} if param_final is None else preallocate_dictionary(param_final, size)[0]
 
         # re-analyse the provided snr_threshold and num_img
         snr_threshold, num_img = self._check_snr_threshold_lensed(snr_threshold, num_img)
 
+        sampling_size = self._next_sampling_size(size, n, events_total, batch_size)
         while n < size:
             # disable print statements
             with contextlib.redirect_stdout(None):
-                self.dict_buffer = None  # this is used to store the sampled lensed_param in batches when running the sampling_routine
                 lensed_param = self.lensed_sampling_routine(
-                    size=self.batch_size, output_jsonfile=buffer_file, resume=False
+                    size=sampling_size, output_jsonfile=buffer_file, resume=False
                 )  # Dimensions are (size, n_max_images)
 
             total_events_in_this_iteration = len(lensed_param["zs"])
@@ -2056,23 +2054,26 @@ class LeR(LensGalaxyParameterDistribution):
 
             snr_hit = self._find_detectable_index_lensed(lensed_param, snr_threshold, pdet_threshold, num_img, detectability_condition, combine_image_snr=combine_image_snr, snr_cut_for_combine_image_snr=snr_cut_for_combine_image_snr)
                     
-            # store all params in json file
-            self._save_detectable_params(output_jsonfile, lensed_param, snr_hit, key_file_name="n_lensed_detectable_events", nan_to_num=nan_to_num, verbose=False, replace_jsonfile=False)
+            # the number of detectable events is counted from the selected indices, the mask is not scanned again
+            n = collect_detectable_params(param_buffer, lensed_param, snr_hit, n, size, nan_to_num=nan_to_num)
 
-            n += np.sum(snr_hit)
             events_total += total_events_in_this_iteration
             total_rate = self.rate_function(n, events_total, param_type="lensed", verbose=False)
+            sampling_size = self._next_sampling_size(size, n, events_total, batch_size)
 
             # save meta data
             self._append_meta_data(meta_data_path, n, events_total, total_rate)
 
-        print(f"storing detectable lensed params in {output_path}")
-        print(f"storing meta data in {meta_data_path}")
-
+        # the json file is written once, after all the events are collected
+        param_final = {key: value[:n] for key, value in param_buffer.items()}
+        self.json_file_names["n_lensed_detectable_events"] = output_jsonfile
         if trim_to_size:
-            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path, param_type="lensed")
+            param_final, total_rate = self._trim_results_to_size(size, output_path, meta_data_path, param_type="lensed", param_final=param_final)
         else:
-            param_final = get_param_from_json(output_path)
+            append_json(output_path, param_final, replace=True)
+
+        print(f"storing detectable lensed params in {output_path}")
+        print(f"storing meta data in {meta_data_path}")
 
         # call self.json_file_names["ler_param"] and for adding the final results
         data = load_json(self.ler_directory+"/"+self.json_file_names["ler_params"])
@@ -2088,6 +2089,32 @@ class LeR(LensGalaxyParameterDistribution):
 
         return param_final
 
+    def _next_sampling_size(self, size, n, events_total, batch_size):
+        """
+        Helper function for selecting_n_unlensed_detectable_events and selecting_n_lensed_detectable_events functions. It gives the number of events to sample in the next iteration: the expected number needed to reach size detectable events, from the detectable fraction so far with a 20% margin, capped at batch_size.
+
+        Parameters
+        ----------
+        size : `int`
+            number of detectable events required.
+        n : `int`
+            number of detectable events collected so far.
+        events_total : `int`
+            total number of events sampled so far.
+        batch_size : `int`
+            batch size for sampling.
+
+        Returns
+        ----------
+        sampling_size : `int`
+            number of events to sample in the next iteration.
+        """
+
+        if n == 0:
+            # detectable fraction not known yet
+            return batch_size
+        return min(batch_size, int((size - n) * events_total / n * 1.2) + 1)
+
     def _initial_setup_for_n_event_selection(self, meta_data_file, output_jsonfile, resume, batch_size):
         """Helper function for selecting_n_unlensed_detectable_events and selecting_n_lensed_detectable_events functions. 
 
@@ -2116,6 +2143,8 @@ class LeR(LensGalaxyParameterDistribution):
             path to the metadata json file.
         buffer_file : `str`
             path to the buffer json file.
+        param_final : `dict`
+            dictionary of the detectable events already collected, if resumed. Otherwise None.
         """
 
         meta_data_path = self.ler_directory+"/"+meta_data_file
@@ -2128,6 +2157,7 @@ class LeR(LensGalaxyParameterDistribution):
         else:
             self.batch_size = batch_size
 
+        param_final = None
         if not resume:
             n = 0  # iterator
             events_total = 0
@@ -2142,8 +2172,11 @@ class LeR(LensGalaxyParameterDistribution):
             if os.path.exists(output_path):
                 param_final = get_param_from_json(output_path)
                 n = len(param_final["zs"])
-                events_total = load_json(meta_data_path)["events_total"][-1]
-                del param_final
+                # the output file is only written at the end of a run, so the meta data of an interrupted run can go beyond it
+                # the last bookmark with n detectable events is the one that matches the output file
+                meta_data = load_json(meta_data_path)
+                idx = np.flatnonzero(np.array(meta_data["detectable_events"]) == n)
+                events_total = meta_data["events_total"][idx[-1] if len(idx) > 0 else -1]
             else:
                 n = 0
                 events_total = 0
@@ -2151,9 +2184,9 @@ class LeR(LensGalaxyParameterDistribution):
         buffer_file = "params_buffer.json"
         print("collected number of detectable events = ", n)
 
-        return n, events_total, output_path, meta_data_path, buffer_file, batch_size
+        return n, events_total, output_path, meta_data_path, buffer_file, batch_size, param_final
 
-    def _trim_results_to_size(self, size, output_path, meta_data_path, param_type="unlensed"):
+    def _trim_results_to_size(self, size, output_path, meta_data_path, param_type="unlensed", param_final=None):
         """
         Helper function of 'selecting_n_unlensed_detectable_events' and 'selecting_n_lensed_detectable_events' functions. Trims the data in the output file to the specified size and updates the metadata accordingly.
 
@@ -2169,6 +2202,9 @@ class LeR(LensGalaxyParameterDistribution):
             type of parameters.
             default param_type = "unlensed".
             other options are "lensed".
+        param_final : `dict`
+            dictionary of the detectable events stored in the output file. If None, it is read from the output file.
+            default param_final = None.
 
         Returns
         ----------
@@ -2179,7 +2215,8 @@ class LeR(LensGalaxyParameterDistribution):
         """
 
         print(f"\n trmming final result to size={size}")
-        param_final = get_param_from_json(output_path)
+        if param_final is None:
+            param_final = get_param_from_json(output_path)
         # randomly select size number of samples
         len_ = len(list(param_final.values())[0])
         idx = np.random.choice(len_, size, replace=False)
@@ -169,16 +169,12 @@ class TrainingDataGenerator():
             print("No data in one of the given range")
             return None
         else:
-            gw_param_final = {}
-            for j, len_ in enumerate(len_arr):  # loop over snr range
-                idx_buffer = np.random.choice(idx_arr[j], len_ref, replace=False)
+            # the indices of all the snr ranges are joined first, so each key is gathered once
+            idx_buffer = np.concatenate([np.random.choice(idx_arr[j], len_ref, replace=False) for j in range(len(len_arr))])  # loop over snr range
 
-                for key, value in gw_param.items():    
-                    buffer_ = value[idx_buffer]
-                    if j==0:
-                        gw_param_final[key] = buffer_
-                    else:
-                        gw_param_final[key] = np.concatenate([gw_param_final[key], buffer_])
+            gw_param_final = {}
+            for key, value in gw_param.items():
+                gw_param_final[key] = value[idx_buffer]
 
             return gw_param_final
 
@@ -199,14 +195,14 @@ class TrainingDataGenerator():
             print("Please provide either file_name_list or path_list")
             return None
 
+        # the arrays of all the files are collected in lists, and concatenated once per key
         for path in path_list:
             data = get_param_from_json(path)
             for key, value in data.items():
                 if key in parameter_list:
-                    if key in combined_dict:
-                        combined_dict[key] = np.concatenate([combined_dict[key], value])
-                    else:
-                        combined_dict[key] = value
+                    combined_dict.setdefault(key, []).append(value)
+        for key, value in combined_dict.items():
+            combined_dict[key] = np.concatenate(value)
 
         json_path = f"{self.ler_init_args['ler_directory']}/{output_jsonfile}"
         print(f"json file saved at: {json_path}\n")
@@ -8,13 +8,32 @@ import pickle
 import h5py
 import numpy as np
 import json
-from scipy.interpolate import interp1d
 from scipy.interpolate import CubicSpline
-from scipy.integrate import quad, cumtrapz
-from numba import njit
+from scipy.integrate import cumtrapz
+from numba import njit, prange
+import math
 # import datetime
 
 
+_default_cosmology = None
+
+def default_cosmology():
+    """
+    Function to get the default cosmology of ler, LambdaCDM(H0=70, Om0=0.3, Ode0=0.7). It is created on the first call, so that importing ler doesn't instantiate it, and the same instance is shared afterwards.
+
+    Returns
+    ----------
+    cosmo : `astropy.cosmology.LambdaCDM`
+        default cosmology
+    """
+
+    global _default_cosmology
+    if _default_cosmology is None:
+        from astropy.cosmology import LambdaCDM
+        _default_cosmology = LambdaCDM(H0=70, Om0=0.3, Ode0=0.7)
+    return _default_cosmology
+
+
 class NumpyEncoder(json.JSONEncoder):
     """
     Class for storing a numpy.ndarray or any nested-list composition as JSON file. This is required for dealing np.nan and np.inf.
@@ -113,6 +132,38 @@ def save_hdf5(file_name, param):
         for key, value in param.items():
             f.create_dataset(key, data=value)
 
+# npz
+def load_npz(file_name):
+    """Load a npz file.
+
+    Parameters
+    ----------
+    file_name : `str`
+        npz file name for storing the parameters.
+
+    Returns
+    ----------
+    param : `dict`
+    """
+    with np.load(file_name) as f:
+        param = {key: f[key] for key in f.files}
+
+    return param
+
+def save_npz(file_name, param):
+    """Save a dictionary of arrays as a (uncompressed) npz file. This is much faster to write and read than json for large parameter dictionaries.
+
+    Parameters
+    ----------
+    file_name : `str`
+        npz file name for storing the parameters.
+    param : `dict`
+        dictionary to be saved as a npz file.
+    """
+    # write through a file handle, so that np.savez doesn't append another .npz to the name
+    with open(file_name, "wb") as f:
+        np.savez(f, **{key: np.asarray(value) for key, value in param.items()})
+
 def load_json(file_name):
     """Load a json file.
 
@@ -125,6 +176,12 @@ def load_json(file_name):
     ----------
     param : `dict`
     """
+    if file_name.endswith(".npz"):
+        return load_npz(file_name)
+    if file_name.endswith((".h5", ".hdf5")):
+        with load_hdf5(file_name) as f:
+            return {key: f[key][()] for key in f.keys()}
+
     with open(file_name, "r", encoding="utf-8") as f:
         param = json.load(f)
 
@@ -133,6 +190,8 @@ def load_json(file_name):
 def save_json(file_name, param):
     """Save a dictionary as a json file.
 
+    The json is written compact, without the indent=4 of older versions of ler. Use `python -m json.tool file_name` for a readable copy.
+
     Parameters
     ----------
     file_name : `str`
@@ -140,8 +199,22 @@ def save_json(file_name, param):
     param : `dict`
         dictionary to be saved as a json file.
     """
+    if file_name.endswith(".npz"):
+        save_npz(file_name, param)
+        return
+    if file_name.endswith((".h5", ".hdf5")):
+        save_hdf5(file_name, param)
+        return
+
+    # json.dumps without indent uses the C encoder, json.dump (and any indent) falls back to the pure python encoder
+    # the keys are encoded one at a time, so that only one array is held as text at once
     with open(file_name, "w", encoding="utf-8") as write_file:
-        json.dump(param, write_file)
+        write_file.write("{")
+        for i, (key, value) in enumerate(param.items()):
+            if i > 0:
+                write_file.write(", ")
+            write_file.write(json.dumps({key: value}, cls=NumpyEncoder)[1:-1])
+        write_file.write("}")
 
 def append_json(file_name, new_dictionary, old_dictionary=None, replace=False):
     """
@@ -152,6 +225,8 @@ def append_json(file_name, new_dictionary, old_dictionary=None, replace=False):
     3. If the file does not exist, create a new one with the new_dictionary.
     4. If none of the above, append the new dictionary to the content of the json file.
 
+    The file is written as a npz archive instead of json if 'file_name' ends with '.npz', and as a hdf5 file if it ends with '.h5' or '.hdf5'.
+
     Parameters
     ----------
     file_name : `str`
@@ -179,8 +254,7 @@ def append_json(file_name, new_dictionary, old_dictionary=None, replace=False):
         data = new_dictionary
     else:
         #print("getting data from file")
-        with open(file_name, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_json(file_name)
     # end = datetime.datetime.now()
     # print(f"Time taken to load the json file: {end-start}")
 
@@ -197,13 +271,37 @@ def append_json(file_name, new_dictionary, old_dictionary=None, replace=False):
     # save the dictionary
     # start = datetime.datetime.now()
     #print(data)
-    with open(file_name, "w", encoding="utf-8") as write_file:
-        json.dump(data, write_file, indent=4, cls=NumpyEncoder)
+    save_json(file_name, data)
     # end = datetime.datetime.now()
     # print(f"Time taken to save the json file: {end-start}")
 
     return data
 
+def save_json_if_changed(file_name, param, stored_params):
+    """
+    Save a dictionary as a json file, unless the same dictionary was already saved in that file and the file still exists.
+
+    Parameters
+    ----------
+    file_name : `str`
+        json file name for storing the parameters.
+    param : `dict`
+        dictionary to be saved as a json file.
+    stored_params : `dict`
+        dictionary of the last dictionary saved in each file, with the file names as keys. It is updated in place.
+
+    Returns
+    ----------
+    saved : `bool`
+        True if the file was written.
+    """
+
+    if stored_params.get(file_name) == param and os.path.exists(file_name):
+        return False
+    append_json(file_name, param, replace=True)
+    stored_params[file_name] = param
+    return True
+
 # def add_dict_values(dict1, dict2):
 #     """Adds the values of two dictionaries together.
     
@@ -239,6 +337,9 @@ def get_param_from_json(json_file):
     ----------
     param : `dict`
     """
+    if json_file.endswith((".npz", ".h5", ".hdf5")):
+        return load_json(json_file)
+
     with open(json_file, "r", encoding="utf-8") as f:
         param = json.load(f)
 
@@ -274,8 +375,10 @@ def rejection_sample(pdf, xmin, xmax, size=100, chunk_size=10000):
     ymax = np.max(y)
 
     # Rejection sample in chunks
+    # accepted chunks are kept as arrays and concatenated once at the end
     x_sample = []
-    while len(x_sample) < size:
+    n = 0
+    while n < size:
         x_try = np.random.uniform(xmin, xmax, size=chunk_size)
         pdf_x_try = pdf(x_try) # Calculate the pdf at the random x values
         # this is for comparing with the pdf value at x_try, will be used to accept or reject the sample
@@ -285,11 +388,11 @@ def rejection_sample(pdf, xmin, xmax, size=100, chunk_size=10000):
         ymax = max(ymax, np.max(pdf_x_try))  
         
         # applying condition to accept the sample
-        # Add while retaining 1D shape of the list
-        x_sample += list(x_try[y_try < pdf_x_try])
+        x_sample.append(x_try[y_try < pdf_x_try])
+        n += len(x_sample[-1])
 
     # Transform the samples to a 1D numpy array
-    x_sample = np.array(x_sample).flatten()
+    x_sample = np.concatenate(x_sample)
     # Return the correct number of samples
     return x_sample[:size]
 
@@ -328,9 +431,11 @@ def rejection_sample2d(pdf, xmin, xmax, ymin, ymax, size=100, chunk_size=10000):
     zmax = np.max(z)
 
     # Rejection sample in chunks
+    # accepted chunks are kept as arrays and concatenated once at the end
     x_sample = []
     y_sample = []
-    while len(x_sample) < size:
+    n = 0
+    while n < size:
         x_try = np.random.uniform(xmin, xmax, size=chunk_size)
         y_try = np.random.uniform(ymin, ymax, size=chunk_size)
         pdf_xy_try = pdf(x_try, y_try)
@@ -340,12 +445,14 @@ def rejection_sample2d(pdf, xmin, xmax, ymin, ymax, size=100, chunk_size=10000):
         # Update the maximum value of the pdf
         zmax = max(zmax, np.max(pdf_xy_try))
 
-        x_sample += list(x_try[z_try < pdf_xy_try])
-        y_sample += list(y_try[z_try < pdf_xy_try])
+        idx = z_try < pdf_xy_try
+        x_sample.append(x_try[idx])
+        y_sample.append(y_try[idx])
+        n += len(x_sample[-1])
 
     # Transform the samples to a 1D numpy array
-    x_sample = np.array(x_sample).flatten()
-    y_sample = np.array(y_sample).flatten()
+    x_sample = np.concatenate(x_sample)
+    y_sample = np.concatenate(y_sample)
     # Return the correct number of samples
     return x_sample[:size], y_sample[:size]
 
@@ -444,6 +551,134 @@ def trim_dictionary(dictionary, size):
             )
     return dictionary
 
+def preallocate_dictionary(dictionary, size):
+    """
+    Function to preallocate the arrays of a dictionary for size samples, with the same keys, dtypes and per-sample shapes. The values of the given dictionary are copied to the start of the new arrays.
+
+    Parameters
+    ----------
+    dictionary : `dict`
+        dictionary of arrays (or nested dictionaries) with the samples drawn so far.
+    size : `int`
+        total number of samples.
+
+    Returns
+    ----------
+    buffer : `dict`
+        dictionary of the preallocated arrays.
+    n : `int`
+        number of samples already filled in the buffer.
+    """
+
+    buffer = {}
+    n = 0
+    for key, value in dictionary.items():
+        if isinstance(value, dict):
+            buffer[key], n = preallocate_dictionary(value, size)
+        else:
+            value = np.asarray(value)
+            n = len(value)
+            buffer[key] = np.empty((max(size, n),) + value.shape[1:], dtype=value.dtype)
+            buffer[key][:n] = value
+    return buffer, n
+
+def fill_dictionary(buffer, dictionary, n):
+    """
+    Function to write the arrays of a dictionary into a preallocated buffer (see preallocate_dictionary), starting at the index n. The buffer arrays are grown if they are too small.
+
+    Parameters
+    ----------
+    buffer : `dict`
+        dictionary of the preallocated arrays.
+    dictionary : `dict`
+        dictionary of arrays (or nested dictionaries) to be written in the buffer.
+    n : `int`
+        number of samples already filled in the buffer.
+
+    Returns
+    ----------
+    n : `int`
+        number of samples filled in the buffer, after writing the dictionary.
+    """
+
+    n_new = n
+    for key, value in dictionary.items():
+        if isinstance(value, dict):
+            n_new = fill_dictionary(buffer[key], value, n)
+        else:
+            value = np.asarray(value)
+            n_new = n + len(value)
+            if n_new > len(buffer[key]):
+                # grow geometrically, in case the sampler returns more samples than requested
+                grown = np.empty((max(n_new, 2 * len(buffer[key])),) + buffer[key].shape[1:], dtype=buffer[key].dtype)
+                grown[:n] = buffer[key][:n]
+                buffer[key] = grown
+            buffer[key][n:n_new] = value
+    return n_new
+
+def select_detectable_params(param, idx_detectable, nan_to_num=False):
+    """
+    Function to keep only the detectable events in a dictionary of GW source parameters. The dictionary is modified in place.
+
+    Parameters
+    ----------
+    param : `dict`
+        dictionary of GW source parameters.
+    idx_detectable : `numpy.ndarray`
+        boolean mask (or index) of detectable events.
+    nan_to_num : `bool`
+        if True, it will replace nan with 0 in the float and complex arrays.
+        default nan_to_num = False.
+
+    Returns
+    ----------
+    param : `dict`
+        dictionary of GW source parameters of the detectable events.
+    """
+
+    # the mask is converted to indices once, instead of being scanned again for every key
+    idx_detectable = np.flatnonzero(idx_detectable)
+    for key, value in param.items():
+        param[key] = value[idx_detectable]
+        if nan_to_num and param[key].dtype.kind in "fc":
+            # the selected array is already a copy, so nan are replaced in place
+            np.nan_to_num(param[key], copy=False)
+    return param
+
+def collect_detectable_params(buffer, param, idx_detectable, n, size, nan_to_num=False):
+    """
+    Function to write the detectable events of a batch in a preallocated buffer (see preallocate_dictionary), after the n events already collected.
+
+    Parameters
+    ----------
+    buffer : `dict`
+        dictionary of the preallocated arrays. If empty, the arrays are allocated for size events, with the dtypes and shapes of this batch.
+    param : `dict`
+        dictionary of GW source parameters of the batch.
+    idx_detectable : `numpy.ndarray`
+        boolean mask (or index) of detectable events.
+    n : `int`
+        number of detectable events already collected in the buffer.
+    size : `int`
+        number of detectable events required.
+    nan_to_num : `bool`
+        if True, it will replace nan with 0 in the float and complex arrays.
+        default nan_to_num = False.
+
+    Returns
+    ----------
+    n : `int`
+        number of detectable events collected in the buffer, including this batch.
+    """
+
+    param = select_detectable_params(param, idx_detectable, nan_to_num=nan_to_num)
+    if buffer:
+        # fill_dictionary grows the buffer if the last batch gives more events than it was allocated for
+        return fill_dictionary(buffer, param, n)
+    new_buffer, n = preallocate_dictionary(param, size)
+    buffer.update(new_buffer)
+    return n
+
 def create_func_pdf_invcdf(x, y, category="function"):
     """
     Function to create a interpolated function, inverse function or inverse cdf from the input x and y.
@@ -472,26 +707,29 @@ def create_func_pdf_invcdf(x, y, category="function"):
     y = np.delete(y, idx)
 
     # create pdf with interpolation
-    pdf_unorm = interp1d(x, y, kind="cubic", fill_value="extrapolate")
+    # CubicSpline (not-a-knot, extrapolating) is the same spline as interp1d(kind="cubic"), with a compiled evaluator
+    pdf_unorm = CubicSpline(x, y)
     if category == "function":
         return pdf_unorm
     if category == "function_inverse":
         # create inverse function
-        return interp1d(y, x, kind="cubic", fill_value="extrapolate")
+        idx = np.argsort(y)
+        return CubicSpline(y[idx], x[idx])
 
     min_, max_ = min(x), max(x)
-    norm = quad(pdf_unorm, min_, max_)[0]
+    # exact integral of the spline
+    norm = pdf_unorm.integrate(min_, max_)
     y = y / norm
     if category == "pdf" or category is None:
         # normalize the pdf
-        pdf = interp1d(x, y, kind="cubic", fill_value="extrapolate")
+        pdf = CubicSpline(x, y)
         return pdf
     # cdf
     cdf_values = cumtrapz(y, x, initial=0)
     idx = np.argwhere(cdf_values > 0)[0][0]
     cdf_values = cdf_values[idx:]
     x = x[idx:]
-    inv_cdf = interp1d(cdf_values, x, kind="cubic", fill_value="extrapolate")
+    inv_cdf = CubicSpline(cdf_values, x)
     if category == "inv_cdf":
         return inv_cdf
     if category == "all":
@@ -587,11 +825,11 @@ def create_pdf(x, y):
     idx = np.argwhere(np.isnan(y))
     x = np.delete(x, idx)
     y = np.delete(y, idx)
-    pdf_unorm = interp1d(x, y, kind="cubic", fill_value="extrapolate")
+    pdf_unorm = CubicSpline(x, y)
     min_, max_ = min(x), max(x)
-    norm = quad(pdf_unorm, min_, max_)[0]
-    y = y / norm
-    return CubicSpline(x, y).c, x
+    # exact integral of the spline, the normalized pdf is the same spline scaled
+    norm = pdf_unorm.integrate(min_, max_)
+    return pdf_unorm.c / norm, x
 
 def create_inv_cdf_array(x, y):
     """
@@ -934,6 +1172,106 @@ def inverse_transform_sampler(size, cdf, x):
     samples = y0 + (y1 - y0) * (u - x0) / (x1 - x0)
     return samples
 
+@njit
+def seed_numba_rng(seed):
+    """
+    Function to seed the random number generator of numba, which is separate from numpy's global generator and is used by the njit samplers. The generator is global to the process, so seeding it affects every sampler that draws from it, not only those of the caller. Kernels with parallel loops draw from per-thread generators, so their draws are only reproducible when numba runs single-threaded (e.g. numba.set_num_threads(1), with the omp or tbb threading layer).
+
+    Parameters
+    ----------
+    seed : `int`
+        seed of the random number generator.
+    """
+    np.random.seed(seed)
+
+def largest_k(x, k, sort=True):
+    """
+    Function to get the k largest values of each row of a 2D array, in descending order (nan last). np.partition selects them in O(n_col) per row, and only the k selected columns are sorted.
+
+    Parameters
+    ----------
+    x : `numpy.ndarray` (2D array)
+        input array, e.g. snr of the lensed images with shape (size, n_max_images).
+    k : `int`
+        number of largest values to keep per row. If k >= x.shape[1], all the columns are kept.
+    sort : `bool`, optional
+        if True, the k values are sorted in descending order. If False, their order is arbitrary. Default is True.
+
+    Returns
+    ----------
+    top : `numpy.ndarray` (2D array of shape (size, min(k, n_col)))
+        k largest values of each row.
+    """
+
+    if k >= x.shape[1]:
+        return -np.sort(-x, axis=1)
+    top = -np.partition(-x, k - 1, axis=1)[:, :k]
+    if sort:
+        top = -np.sort(-top, axis=1)
+    return top
+
+@njit(parallel=True, cache=True)
+def lensed_snr_threshold_check(snr, snr_threshold, compute_pdet=False):
+    """
+    Function to check the snr of the lensed images against the thresholds, in a single row-parallel pass. For each event, the images are sorted by snr in descending order (nan last), and the i-th brightest image is compared with snr_threshold[i].
+
+    Parameters
+    ----------
+    snr : `numpy.ndarray` (2D array of float, shape=(size, n_max_images))
+        snr of the lensed images.
+    snr_threshold : `numpy.ndarray` (1D array of float)
+        threshold of each required image, in descending order, e.g. [8,8,6] for two images with snr>8 and a third one with snr>6.
+    compute_pdet : `bool`, optional
+        if True, also compute the product of the detection probabilities 1-norm.cdf(snr_threshold-snr) of the required images. Default is False.
+
+    Returns
+    ----------
+    snr_hit : `numpy.ndarray` (1D array of bool)
+        True if all the required images are above their thresholds.
+    pdet : `numpy.ndarray` (1D array of float)
+        product of the detection probabilities of the required images. Only filled if compute_pdet=True.
+    """
+
+    size, n_col = snr.shape
+    k = len(snr_threshold)
+    snr_hit = np.zeros(size, dtype=np.bool_)
+    pdet = np.zeros(size)
+    if n_col < k:
+        # not enough images
+        return snr_hit, pdet
+
+    for i in prange(size):
+        # partial insertion sort, keeping only the k brightest images of the row
+        top = np.full(k, -np.inf)
+        n_nan = 0
+        for j in range(n_col):
+            val = snr[i, j]
+            if np.isnan(val):
+                n_nan += 1
+                continue
+            if val <= top[k - 1]:
+                continue
+            m = k - 1
+            while m > 0 and top[m - 1] < val:
+                top[m] = top[m - 1]
+                m -= 1
+            top[m] = val
+        # nan are sorted after all the finite values
+        n_finite = min(n_col - n_nan, k)
+        for m in range(n_finite, k):
+            top[m] = np.nan
+
+        hit = True
+        prob = 1.0
+        for m in range(k):
+            hit = hit and (top[m] > snr_threshold[m])
+            if compute_pdet:
+                prob *= 0.5 * math.erfc((snr_threshold[m] - top[m]) / math.sqrt(2.0))
+        snr_hit[i] = hit
+        pdet[i] = prob
+
+    return snr_hit, pdet
+
 def batch_handler(size, batch_size, sampling_routine, output_jsonfile, save_batch=True, resume=False, param_name='parameters'):
     """
     Function to run the sampling in batches.
@@ -987,10 +1325,12 @@ def batch_handler(size, batch_size, sampling_routine, output_jsonfile, save_batc
     else:
         frac_batches = size
     track_batches = 0  # to track the number of batches
+    first_batch_created = False  # if True, the first batch is only in memory (unless save_batch=True) and has to be saved
 
     if not resume:
         # create new first batch with the frac_batches
         track_batches, dict_buffer = create_batch_params(sampling_routine, frac_batches, dict_buffer, save_batch, output_jsonfile, track_batches=track_batches)
+        first_batch_created = True
     else:
         # check where to resume from
         # identify the last batch and assign current batch number
@@ -1002,28 +1342,39 @@ def batch_handler(size, batch_size, sampling_routine, output_jsonfile, save_batc
         except:
             # create new first batch with the frac_batches
             track_batches, dict_buffer = create_batch_params(sampling_routine, frac_batches, dict_buffer, save_batch, output_jsonfile, track_batches=track_batches)
+            first_batch_created = True
 
     # loop over the remaining batches
     min_, max_ = track_batches, num_batches
     # print(f"min_ = {min_}, max_ = {max_}")
     save_param = False
     if min_ == max_:
-        print(f"{param_name} already sampled.")
+        if first_batch_created:
+            # the single batch was just sampled, it is saved below unless it was already saved in create_batch_params
+            save_param = not save_batch
+        else:
+            print(f"{param_name} already sampled.")
     elif min_ > max_:
         len_ = len(list(dict_buffer.values())[0])
         print(f"existing {param_name} size is {len_} is more than the required size={size}. It will be trimmed.")
         dict_buffer = trim_dictionary(dict_buffer, size)
         save_param = True
-    else:
+    elif save_batch:
         for i in range(min_, max_):
             _, dict_buffer = create_batch_params(sampling_routine, batch_size, dict_buffer, save_batch, output_jsonfile, track_batches=i, resume=True)
 
-        if save_batch:
-            # if save_batch=True, then dict_buffer is only the last batch
-            dict_buffer = get_param_from_json(output_jsonfile)
-        else:  # dont save in batches
-            # this if condition is required if there is nothing to save
-            save_param = True
+        # if save_batch=True, then dict_buffer is only the last batch
+        dict_buffer = get_param_from_json(output_jsonfile)
+    else:  # dont save in batches
+        # preallocate the arrays for all the batches, and fill them batch by batch
+        dict_buffer, n = preallocate_dictionary(dict_buffer, size)
+        for i in range(min_, max_):
+            _, param = create_batch_params(sampling_routine, batch_size, None, save_batch, output_jsonfile, track_batches=i, resume=True)
+            n = fill_dictionary(dict_buffer, param, n)
+        dict_buffer = trim_dictionary(dict_buffer, n)
+
+        # this if condition is required if there is nothing to save
+        save_param = True
     
     if save_param:
         # store all params in json file